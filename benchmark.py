@@ -0,0 +1,467 @@
+"""Reproducible benchmarks for the dataset operations of the COCO-Style Dataset Doctor.
+
+Synthetic COCO datasets are generated once per size tier and every operation is
+timed in a fresh process, recording wall time and peak RSS.
+
+Usage:
+    python benchmark.py --tiers 10k 100k --save-baseline benchmark_baseline.json
+    python benchmark.py --tiers 10k 100k --baseline benchmark_baseline.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Number of annotations per size tier
+SIZE_TIERS = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "5m": 5_000_000,
+}
+
+# Annotations per image and number of categories of the synthetic datasets
+ANNOTATIONS_PER_IMAGE = 10
+NUM_CATEGORIES = 80
+
+# Fraction of annotations stored as crowd RLE instead of polygons
+RLE_FRACTION = 0.01
+
+# Size of the generated image files
+IMAGE_SIZE = (640, 480)
+
+# Number of images drawn by the render benchmark
+NUM_RENDERED_IMAGES = 20
+
+# Number of annotation shards the dataset is split into for the sharded loading cases
+NUM_SHARDS = 8
+
+# Slowdown factor above which a result counts as a regression
+REGRESSION_THRESHOLD = 1.2
+
+
+def rectangle_rle_counts(x0, y0, x1, y1, height, width):
+    """Return uncompressed column-major RLE counts of a filled rectangle."""
+    box_height = y1 - y0
+    counts = [x0 * height + y0, box_height]
+    for _ in range(x1 - x0 - 1):
+        counts.extend([height - box_height, box_height])
+    counts.append(height * width - sum(counts))
+    return counts
+
+
+def generate_synthetic_coco(
+    num_annotations,
+    num_categories=NUM_CATEGORIES,
+    annotations_per_image=ANNOTATIONS_PER_IMAGE,
+    image_size=IMAGE_SIZE,
+    seed=0,
+):
+    """Generate a synthetic COCO dataset with polygon and RLE segmentations."""
+    rng = np.random.default_rng(seed)
+    width, height = image_size
+    num_images = max(1, num_annotations // annotations_per_image)
+
+    categories = [
+        {"id": i + 1, "name": f"class_{i + 1}", "supercategory": f"group_{i % 8}"}
+        for i in range(num_categories)
+    ]
+    images = [
+        {"id": i + 1, "file_name": f"{i + 1:08d}.jpg", "width": width, "height": height}
+        for i in range(num_images)
+    ]
+
+    # Draw all random values at once
+    image_ids = rng.integers(1, num_images + 1, num_annotations)
+    category_ids = rng.integers(1, num_categories + 1, num_annotations)
+    box_widths = rng.integers(8, width // 3, num_annotations)
+    box_heights = rng.integers(8, height // 3, num_annotations)
+    xs = rng.integers(0, width - box_widths)
+    ys = rng.integers(0, height - box_heights)
+    is_rle = rng.random(num_annotations) < RLE_FRACTION
+
+    # Octagons inscribed into the boxes as polygon segmentations
+    angles = np.linspace(0, 2 * np.pi, 8, endpoint=False)
+    polygon_xs = xs[:, None] + box_widths[:, None] * (0.5 + 0.5 * np.cos(angles))
+    polygon_ys = ys[:, None] + box_heights[:, None] * (0.5 + 0.5 * np.sin(angles))
+    polygons = np.round(np.stack([polygon_xs, polygon_ys], axis=2), 2).reshape(
+        num_annotations, -1
+    )
+
+    annotations = []
+    for i in range(num_annotations):
+        x, y, w, h = int(xs[i]), int(ys[i]), int(box_widths[i]), int(box_heights[i])
+        if is_rle[i]:
+            segmentation = {
+                "counts": rectangle_rle_counts(x, y, x + w, y + h, height, width),
+                "size": [height, width],
+            }
+        else:
+            segmentation = [polygons[i].tolist()]
+        annotations.append(
+            {
+                "id": i + 1,
+                "image_id": int(image_ids[i]),
+                "category_id": int(category_ids[i]),
+                "bbox": [x, y, w, h],
+                "area": w * h,
+                "iscrowd": int(is_rle[i]),
+                "segmentation": segmentation,
+            }
+        )
+
+    return {
+        "info": {"description": f"Synthetic COCO dataset (seed {seed})"},
+        "licenses": [],
+        "categories": categories,
+        "images": images,
+        "annotations": annotations,
+    }
+
+
+def write_synthetic_images(dataset, image_folder, seed=0):
+    """Write one JPEG file per image of the dataset."""
+    os.makedirs(image_folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    width, height = IMAGE_SIZE
+
+    # Encode a small set of noise images once and reuse their bytes
+    variants = []
+    for _ in range(8):
+        pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+        variants.append(buffer.getvalue())
+
+    for i, img in enumerate(dataset["images"]):
+        with open(os.path.join(image_folder, img["file_name"]), "wb") as f:
+            f.write(variants[i % len(variants)])
+
+
+def write_annotation_shards(annotation_file, shard_dir, num_shards=NUM_SHARDS):
+    """Split an annotation file by image into shard files of a directory."""
+    with open(annotation_file, "r") as f:
+        dataset = json.load(f)
+
+    images = dataset["images"]
+    shard_of_image = {
+        img["id"]: i * num_shards // len(images) for i, img in enumerate(images)
+    }
+    shards = [
+        {"categories": dataset["categories"], "images": [], "annotations": []}
+        for _ in range(num_shards)
+    ]
+    for img in images:
+        shards[shard_of_image[img["id"]]]["images"].append(img)
+    for ann in dataset["annotations"]:
+        shards[shard_of_image[ann["image_id"]]]["annotations"].append(ann)
+
+    os.makedirs(shard_dir, exist_ok=True)
+    for i, shard in enumerate(shards):
+        with open(os.path.join(shard_dir, f"shard_{i:03d}.json"), "w") as f:
+            json.dump(shard, f)
+
+
+def prepare_tier(data_dir, tier, num_annotations, seed=0):
+    """Generate the synthetic datasets of a size tier unless they already exist."""
+    tier_dir = os.path.join(data_dir, tier)
+    paths = {
+        "annotation_file": os.path.join(tier_dir, "annotations.json"),
+        "image_folder": os.path.join(tier_dir, "images"),
+        "merge_annotation_file": os.path.join(tier_dir, "merge_annotations.json"),
+    }
+    shard_dir = os.path.join(tier_dir, "shards")
+    if all(os.path.exists(path) for path in paths.values()):
+        if not os.path.isdir(shard_dir):
+            write_annotation_shards(paths["annotation_file"], shard_dir)
+        paths["shard_dir"] = shard_dir
+        return paths
+
+    print(f"Generating synthetic dataset for tier {tier} ...")
+    os.makedirs(tier_dir, exist_ok=True)
+    dataset = generate_synthetic_coco(num_annotations, seed=seed)
+    write_synthetic_images(dataset, paths["image_folder"], seed=seed)
+    with open(paths["annotation_file"], "w") as f:
+        json.dump(dataset, f)
+
+    # Second dataset with a different seed as merge source, sharing the images
+    merge_dataset = generate_synthetic_coco(num_annotations, seed=seed + 1)
+    with open(paths["merge_annotation_file"], "w") as f:
+        json.dump(merge_dataset, f)
+
+    write_annotation_shards(paths["annotation_file"], shard_dir)
+    paths["shard_dir"] = shard_dir
+    return paths
+
+
+class StubWidget:
+    """Stand-in for a tkinter widget that ignores every call."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class StubVariable:
+    """Stand-in for a tkinter variable."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class StubDialogs:
+    """Stand-in for messagebox and filedialog that confirms every prompt."""
+
+    def __init__(self, output_dir=""):
+        self.output_dir = output_dir
+
+    def askyesno(self, *args, **kwargs):
+        return True
+
+    def askdirectory(self, *args, **kwargs):
+        return self.output_dir
+
+    def asksaveasfilename(self, *args, **kwargs):
+        return os.path.join(self.output_dir, kwargs.get("initialfile", "output.json"))
+
+    def showinfo(self, *args, **kwargs):
+        pass
+
+    def showerror(self, *args, **kwargs):
+        raise RuntimeError(args[-1] if args else "Error dialog shown")
+
+
+def create_headless_gui(output_dir=""):
+    """Create the dataset GUI without a window, replacing widgets and dialogs."""
+    import main
+
+    dialogs = StubDialogs(output_dir)
+    main.messagebox = dialogs
+    main.filedialog = dialogs
+    main.ImageTk = type("StubImageTk", (), {"PhotoImage": staticmethod(lambda i: i)})
+
+    class HeadlessDatasetGUI(main.CocoDatasetGUI):
+        def __init__(self):
+            # Skip the tkinter initialization, only set up the dataset state
+            self.init_dataset_state()
+            self.recent_paths = {}
+            for name in (
+                "image_label",
+                "image_index_label",
+                "image_info_textbox",
+                "annotation_textbox",
+                "classes_textbox",
+                "info_textbox",
+                "compare_window",
+                "manage_window",
+                "shard_filter_menu",
+                "review_menu",
+                "jump_entry",
+            ):
+                setattr(self, name, StubWidget())
+            self.show_masks_var = StubVariable(True)
+            self.database_mode_var = StubVariable(False)
+
+        def save_recent_paths(self):
+            pass
+
+        def after(self, delay, callback, *args):
+            # Without an event loop, scheduled renders run immediately
+            callback(*args)
+
+        def after_cancel(self, after_id):
+            pass
+
+    return HeadlessDatasetGUI()
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of the current process in MB."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(case, paths):
+    """Set up and time one benchmark case. Runs in a fresh process."""
+    from pycocotools.coco import COCO
+
+    from sharded_loading import load_sharded_dataset
+
+    output_dir = tempfile.mkdtemp(prefix="dataset_doctor_benchmark_")
+    try:
+        gui = create_headless_gui(output_dir)
+        annotation_file = paths["annotation_file"]
+        image_folder = paths["image_folder"]
+
+        if case == "load_dataset_from_paths":
+            start = time.perf_counter()
+            gui.load_dataset_from_paths(annotation_file, image_folder)
+            wall_time = time.perf_counter() - start
+            if gui.coco is None:
+                raise RuntimeError("Dataset was not loaded")
+            return wall_time, peak_rss_mb()
+
+        if case in ("load_sharded_dataset", "load_sharded_dataset_sequential"):
+            # The default uses one worker per CPU, so run it on a multi-core machine
+            max_workers = 1 if case == "load_sharded_dataset_sequential" else None
+            start = time.perf_counter()
+            load_sharded_dataset(paths["shard_dir"], max_workers=max_workers)
+            return time.perf_counter() - start, peak_rss_mb()
+
+        gui.load_dataset_from_paths(annotation_file, image_folder)
+
+        if case == "delete_current_image":
+            gui.current_index = len(gui.image_ids) // 2
+            start = time.perf_counter()
+            gui.delete_current_image()
+
+        elif case == "apply_class_changes":
+            # Shift the IDs of half of the categories and delete one category
+            cat_ids = sorted(gui.coco.getCatIds())
+            gui.class_entries = {
+                cat_id: StubVariable(str(cat_id + 1000) if i % 2 == 0 else "")
+                for i, cat_id in enumerate(cat_ids)
+            }
+            gui.class_delete_vars = {
+                cat_id: StubVariable(i == len(cat_ids) - 1)
+                for i, cat_id in enumerate(cat_ids)
+            }
+            start = time.perf_counter()
+            gui.apply_class_changes()
+
+        elif case == "merge_datasets":
+            new_coco = COCO(paths["merge_annotation_file"])
+            start = time.perf_counter()
+            gui.merge_datasets(new_coco, image_folder)
+
+        elif case == "draw_annotations_on_image":
+            image_ids = gui.image_ids[:NUM_RENDERED_IMAGES]
+            images = [
+                Image.open(gui.image_id_to_path[image_id]).convert("RGB")
+                for image_id in image_ids
+            ]
+            start = time.perf_counter()
+            for image, image_id in zip(images, image_ids):
+                gui.draw_annotations_on_image(image, image_id)
+            return (time.perf_counter() - start) / len(image_ids), peak_rss_mb()
+
+        elif case == "export_modified_annotations":
+            start = time.perf_counter()
+            gui.export_modified_annotations()
+
+        elif case == "export_dataset":
+            start = time.perf_counter()
+            gui.export_dataset()
+
+        else:
+            raise ValueError(f"Unknown benchmark case: {case}")
+
+        return time.perf_counter() - start, peak_rss_mb()
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+# Benchmarked operations in execution order
+BENCHMARK_CASES = [
+    "load_dataset_from_paths",
+    "load_sharded_dataset",
+    "load_sharded_dataset_sequential",
+    "delete_current_image",
+    "apply_class_changes",
+    "merge_datasets",
+    "draw_annotations_on_image",
+    "export_modified_annotations",
+    "export_dataset",
+]
+
+
+def run_benchmarks(tiers, cases, data_dir, seed=0):
+    """Run all cases for all tiers, each in a fresh process, and return the results."""
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for tier in tiers:
+        paths = prepare_tier(data_dir, tier, SIZE_TIERS[tier], seed)
+        for case in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                wall_time, peak_rss = executor.submit(run_case, case, paths).result()
+            results.setdefault(case, {})[tier] = {
+                "wall_time": wall_time,
+                "peak_rss_mb": peak_rss,
+            }
+            print(
+                f"{tier:>5} {case:<30} {wall_time:10.4f} s"
+                + (f" {peak_rss:10.1f} MB" if peak_rss is not None else "")
+            )
+    return results
+
+
+def compare_with_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print the results relative to the baseline and return the regressions."""
+    regressions = []
+    for case, tiers in results.items():
+        for tier, result in tiers.items():
+            reference = baseline.get(case, {}).get(tier)
+            if not reference:
+                continue
+            time_ratio = result["wall_time"] / max(reference["wall_time"], 1e-9)
+            line = f"{tier:>5} {case:<30} time x{time_ratio:5.2f}"
+            if result["peak_rss_mb"] and reference.get("peak_rss_mb"):
+                rss_ratio = result["peak_rss_mb"] / reference["peak_rss_mb"]
+                line += f"  rss x{rss_ratio:5.2f}"
+            if time_ratio > threshold:
+                line += "  REGRESSION"
+                regressions.append((case, tier, time_ratio))
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--tiers", nargs="+", default=["10k", "100k"], choices=list(SIZE_TIERS)
+    )
+    parser.add_argument(
+        "--cases", nargs="+", default=BENCHMARK_CASES, choices=BENCHMARK_CASES
+    )
+    parser.add_argument("--data-dir", default="benchmark_data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="Baseline JSON file to compare against")
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.tiers, args.cases, args.data_dir, args.seed)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above x{args.threshold}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from itertools import chain
+
+import numpy as np
+
+
+def bbox_array(anns):
+    """Return the bboxes of annotations as an (N, 4) float array of x, y, w, h.
+
+    Missing or malformed bboxes become zero-size boxes.
+    """
+    bboxes = [ann.get("bbox") for ann in anns]
+    if all(type(bbox) is list and len(bbox) == 4 for bbox in bboxes):
+        # Fast path without an intermediate list per row
+        return np.fromiter(
+            chain.from_iterable(bboxes), dtype=np.float64, count=4 * len(bboxes)
+        ).reshape(-1, 4)
+    return np.array(
+        [
+            (
+                bbox
+                if isinstance(bbox, list) and len(bbox) == 4
+                else [0.0, 0.0, 0.0, 0.0]
+            )
+            for bbox in bboxes
+        ],
+        dtype=np.float64,
+    ).reshape(-1, 4)
+
+
+def paired_iou(boxes_a, boxes_b):
+    """Return the IoU of row-aligned pairs of x, y, w, h boxes."""
+    x1 = np.maximum(boxes_a[:, 0], boxes_b[:, 0])
+    y1 = np.maximum(boxes_a[:, 1], boxes_b[:, 1])
+    x2 = np.minimum(boxes_a[:, 0] + boxes_a[:, 2], boxes_b[:, 0] + boxes_b[:, 2])
+    y2 = np.minimum(boxes_a[:, 1] + boxes_a[:, 3], boxes_b[:, 1] + boxes_b[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = boxes_a[:, 2] * boxes_a[:, 3] + boxes_b[:, 2] * boxes_b[:, 3] - intersection
+    return np.divide(
+        intersection, union, out=np.zeros_like(intersection), where=union > 0
+    )
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Return the IoU matrix of two sets of x, y, w, h boxes.
+
+    Leading dimensions are batch dimensions, so (G, N, 4) and (G, M, 4) inputs
+    give (G, N, M) IoUs for G independent box sets.
+    """
+    a = boxes_a[..., :, None, :]
+    b = boxes_b[..., None, :, :]
+    x1 = np.maximum(a[..., 0], b[..., 0])
+    y1 = np.maximum(a[..., 1], b[..., 1])
+    x2 = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2])
+    y2 = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - intersection
+    return np.divide(
+        intersection, union, out=np.zeros_like(intersection), where=union > 0
+    )
+
+
+def group_by_image(image_ids):
+    """Group annotation rows by image through a stable sort of the image IDs.
+
+    Returns the sort order and the start and end offsets of every image group in
+    that order, so the rows of group i are order[starts[i]:ends[i]].
+    """
+    image_ids = np.asarray(image_ids)
+    order = np.argsort(image_ids, kind="stable")
+    sorted_ids = image_ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    ends = np.r_[starts[1:], len(sorted_ids)]
+    return order, starts, ends
+
+
+def greedy_match(iou, threshold):
+    """Match rows to columns of an IoU matrix greedily by descending IoU.
+
+    Returns the matched (row, column) index arrays of pairs with IoU >= threshold.
+    """
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind="stable")
+    used_rows = set()
+    used_cols = set()
+    matched_rows = []
+    matched_cols = []
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matched_rows.append(row)
+        matched_cols.append(col)
+    return np.array(matched_rows, dtype=np.int64), np.array(
+        matched_cols, dtype=np.int64
+    )
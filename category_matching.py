@@ -0,0 +1,135 @@
+import json
+import re
+
+import numpy as np
+
+# Decisions for source categories besides mapping to a target category
+ADD_AS_NEW = "new"
+DROP = "drop"
+
+
+def normalize_category_name(name):
+    """Normalize a category name: case-folded, '_' and '-' as spaces, single spaces."""
+    return " ".join(re.sub(r"[_\-]+", " ", str(name)).casefold().split())
+
+
+def load_alias_table(path):
+    """Load an alias table from a JSON file.
+
+    The file maps canonical names to lists of aliases, e.g.
+    {"person": ["pedestrian", "human"]}. Returns a mapping from normalized alias
+    to normalized canonical name.
+    """
+    with open(path, "r") as f:
+        table = json.load(f)
+
+    aliases = {}
+    for canonical, names in table.items():
+        if isinstance(names, str):
+            names = [names]
+        for name in names:
+            aliases[normalize_category_name(name)] = normalize_category_name(canonical)
+    return aliases
+
+
+def canonical_name(name, aliases=None):
+    """Return the normalized name of a category, resolving aliases."""
+    name = normalize_category_name(name)
+    if aliases:
+        return aliases.get(name, name)
+    return name
+
+
+def match_categories(target_cats, source_cats, aliases=None):
+    """Match the source categories to the target categories.
+
+    Categories match if their normalized names are equal after resolving aliases.
+    If several target categories share a name, the supercategory decides; the
+    ID is only used as last tie-breaker. Returns one (target ID or None, reason)
+    per source category.
+    """
+    by_name = {}
+    for cat in target_cats:
+        by_name.setdefault(canonical_name(cat["name"], aliases), []).append(cat)
+
+    matches = []
+    for cat in source_cats:
+        name = normalize_category_name(cat["name"])
+        candidates = by_name.get(canonical_name(name, aliases), [])
+        if not candidates:
+            matches.append((None, None))
+            continue
+
+        reason = (
+            "name"
+            if any(normalize_category_name(c["name"]) == name for c in candidates)
+            else "alias"
+        )
+        if len(candidates) > 1:
+            supercategory = normalize_category_name(cat.get("supercategory", ""))
+            same_super = [
+                c
+                for c in candidates
+                if normalize_category_name(c.get("supercategory", "")) == supercategory
+            ]
+            if same_super:
+                candidates = same_super
+                reason += "+supercategory"
+            same_id = [c for c in candidates if c["id"] == cat["id"]]
+            candidates = same_id or candidates
+        matches.append((candidates[0]["id"], reason))
+    return matches
+
+
+def default_decisions(matches):
+    """Map matched categories and add unmatched categories as new ones."""
+    return [ADD_AS_NEW if target_id is None else target_id for target_id, _ in matches]
+
+
+def build_translation_table(target_cats, source_cats, decisions):
+    """Turn per-category decisions into an ID translation table.
+
+    Returns the categories to add to the target and the table as two sorted
+    arrays (source IDs, target IDs), where a target ID of -1 drops the category.
+    """
+    next_id = max((cat["id"] for cat in target_cats), default=0) + 1
+    new_categories = []
+    table = {}
+    for cat, decision in zip(source_cats, decisions):
+        if decision == DROP:
+            table[cat["id"]] = -1
+        elif decision == ADD_AS_NEW:
+            new_categories.append(dict(cat, id=next_id))
+            table[cat["id"]] = next_id
+            next_id += 1
+        else:
+            table[cat["id"]] = decision
+
+    source_ids = np.array(sorted(table), dtype=np.int64)
+    target_ids = np.array([table[cat_id] for cat_id in source_ids], dtype=np.int64)
+    return new_categories, (source_ids, target_ids)
+
+
+def remap_ids(ids, table):
+    """Translate an array of IDs with a table in one vectorized lookup.
+
+    IDs missing from the table are translated to -1.
+    """
+    source_ids, target_ids = table
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(source_ids):
+        return np.full(len(ids), -1, dtype=np.int64)
+    positions = np.searchsorted(source_ids, ids).clip(max=len(source_ids) - 1)
+    found = source_ids[positions] == ids
+    return np.where(found, target_ids[positions], -1)
+
+
+def count_annotations_per_category(annotations):
+    """Return a {category ID: number of annotations} mapping."""
+    category_ids = np.fromiter(
+        (ann["category_id"] for ann in annotations),
+        dtype=np.int64,
+        count=len(annotations),
+    )
+    ids, counts = np.unique(category_ids, return_counts=True)
+    return dict(zip(ids.tolist(), counts.tolist()))
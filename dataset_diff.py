@@ -0,0 +1,281 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from boxes import bbox_array, greedy_match, group_by_image, iou_matrix, paired_iou
+from category_matching import remap_ids
+
+# Maximum bbox coordinate difference in pixels for a box to count as unchanged
+BOX_TOLERANCE = 1e-2
+
+# Default IoU at or above which two boxes are considered the same object
+DIFF_IOU_THRESHOLD = 0.5
+
+# Annotation change classes in the order they are presented
+DIFF_STATUSES = ("added", "removed", "relabeled", "moved")
+
+
+def annotation_arrays(anns):
+    """Return IDs, image IDs, category IDs and bboxes of annotations as arrays."""
+    ids = np.fromiter((ann["id"] for ann in anns), dtype=np.int64, count=len(anns))
+    image_ids = np.fromiter(
+        (ann["image_id"] for ann in anns), dtype=np.int64, count=len(anns)
+    )
+    category_ids = np.fromiter(
+        (ann["category_id"] for ann in anns), dtype=np.int64, count=len(anns)
+    )
+    return ids, image_ids, category_ids, bbox_array(anns)
+
+
+def image_translation(old_images, new_images, match_by):
+    """Join the images of both versions by ID or by file name.
+
+    Returns the old to new image ID table for remap_ids() and the images that
+    only exist in the new or only in the old version.
+    """
+    if match_by == "id":
+        new_by_key = {img["id"]: img for img in new_images}
+        old_keys = [img["id"] for img in old_images]
+    else:
+        new_by_key = {img["file_name"]: img for img in new_images}
+        old_keys = [img["file_name"] for img in old_images]
+
+    pairs = {}
+    removed = []
+    for img, key in zip(old_images, old_keys):
+        new_img = new_by_key.get(key)
+        if new_img is None:
+            removed.append(img)
+        else:
+            pairs[img["id"]] = new_img["id"]
+    matched_new_ids = set(pairs.values())
+    added = [img for img in new_images if img["id"] not in matched_new_ids]
+
+    old_ids = np.array(sorted(pairs), dtype=np.int64)
+    table = (old_ids, np.array([pairs[i] for i in old_ids.tolist()], dtype=np.int64))
+    return table, added, removed
+
+
+def join_by_key(old_keys, new_keys):
+    """Join two integer key matrices with one sort, pairing equal keys in order.
+
+    Returns the index arrays of the joined old and new rows.
+    """
+    keys = np.vstack([old_keys, new_keys])
+    is_new = np.r_[np.zeros(len(old_keys), bool), np.ones(len(new_keys), bool)]
+
+    # Sort by key with the old rows of equal keys first, lexsort is stable
+    order = np.lexsort(np.c_[keys, is_new].T[::-1])
+    sorted_keys = keys[order]
+    sorted_new = is_new[order]
+    positions = np.arange(len(keys))
+    group_starts = np.maximum.accumulate(
+        np.where(
+            np.r_[True, np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)],
+            positions,
+            0,
+        )
+    )
+
+    # Pair the k-th new row of every key with its k-th old row
+    cum_old = np.cumsum(~sorted_new)
+    olds_before_group = np.where(group_starts > 0, cum_old[group_starts - 1], 0)
+    new_positions = np.flatnonzero(sorted_new)
+    group_starts = group_starts[new_positions]
+    num_old = cum_old[new_positions] - olds_before_group[new_positions]
+    rank = new_positions - group_starts - num_old
+    matched = rank < num_old
+    old_positions = group_starts[matched] + rank[matched]
+    return order[old_positions], order[new_positions[matched]] - len(old_keys)
+
+
+def unmatched_rows(num_rows, matched_idx):
+    """Return the row indices not contained in matched_idx."""
+    unmatched = np.ones(num_rows, dtype=bool)
+    unmatched[matched_idx] = False
+    return np.flatnonzero(unmatched)
+
+
+def match_within_images(
+    old_idx, new_idx, old_images, new_images, old_boxes, new_boxes, threshold
+):
+    """Match remaining boxes of the same image greedily by IoU.
+
+    Returns the index arrays of the matched old and new rows.
+    """
+    old_order, old_starts, old_ends = group_by_image(old_images[old_idx])
+    old_groups = {
+        int(old_images[old_idx[old_order[start]]]): old_idx[old_order[start:end]]
+        for start, end in zip(old_starts, old_ends)
+    }
+    new_order, new_starts, new_ends = group_by_image(new_images[new_idx])
+
+    matched_old = []
+    matched_new = []
+    for start, end in zip(new_starts, new_ends):
+        new_rows = new_idx[new_order[start:end]]
+        old_rows = old_groups.get(int(new_images[new_rows[0]]))
+        if old_rows is None:
+            continue
+        rows, cols = greedy_match(
+            iou_matrix(old_boxes[old_rows], new_boxes[new_rows]), threshold
+        )
+        matched_old.append(old_rows[rows])
+        matched_new.append(new_rows[cols])
+    if not matched_old:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(matched_old), np.concatenate(matched_new)
+
+
+def diff_datasets(old, new, match_by="id", iou_threshold=DIFF_IOU_THRESHOLD):
+    """Compare two versions of a dataset.
+
+    Images are joined by ID or, with match_by='key', by file name. Annotations are
+    joined by ID, or by image and bbox with the remaining boxes of an image matched
+    by IoU. Joined annotations below the IoU threshold are different objects.
+    Each joined pair is classified as relabeled (category changed), moved (bbox
+    changed) or unchanged; unjoined annotations are added or removed. All joins
+    and comparisons work on sorted arrays. Returns a report with a summary and
+    one entry per changed annotation, referencing images by their new ID.
+    """
+    table, added_images, removed_images = image_translation(
+        old.get("images", []), new.get("images", []), match_by
+    )
+    old_anns = old.get("annotations", [])
+    new_anns = new.get("annotations", [])
+    old_ids, old_images, old_cats, old_boxes = annotation_arrays(old_anns)
+    new_ids, new_images, new_cats, new_boxes = annotation_arrays(new_anns)
+    old_images = remap_ids(old_images, table)
+
+    if match_by == "id":
+        _, old_idx, new_idx = np.intersect1d(old_ids, new_ids, return_indices=True)
+        # A reused ID on a different object counts as removed and added
+        same = (old_images[old_idx] == new_images[new_idx]) & (
+            paired_iou(old_boxes[old_idx], new_boxes[new_idx]) >= iou_threshold
+        )
+        old_idx, new_idx = old_idx[same], new_idx[same]
+    else:
+        # Exact geometry first, then IoU matching of the remaining boxes per image
+        old_keys = np.c_[old_images, np.round(old_boxes * 100)].astype(np.int64)
+        new_keys = np.c_[new_images, np.round(new_boxes * 100)].astype(np.int64)
+        old_idx, new_idx = join_by_key(old_keys, new_keys)
+        old_rest = unmatched_rows(len(old_anns), old_idx)
+        old_rest = old_rest[old_images[old_rest] >= 0]
+        new_rest = unmatched_rows(len(new_anns), new_idx)
+        if len(old_rest) and len(new_rest):
+            rest_old_idx, rest_new_idx = match_within_images(
+                old_rest,
+                new_rest,
+                old_images,
+                new_images,
+                old_boxes,
+                new_boxes,
+                iou_threshold,
+            )
+            old_idx = np.r_[old_idx, rest_old_idx]
+            new_idx = np.r_[new_idx, rest_new_idx]
+
+    relabeled = old_cats[old_idx] != new_cats[new_idx]
+    moved = ~relabeled & np.any(
+        np.abs(old_boxes[old_idx] - new_boxes[new_idx]) > BOX_TOLERANCE, axis=1
+    )
+    ious = paired_iou(old_boxes[old_idx], new_boxes[new_idx])
+    removed = unmatched_rows(len(old_anns), old_idx)
+    added = unmatched_rows(len(new_anns), new_idx)
+
+    changes = []
+    for i in added.tolist():
+        ann = new_anns[i]
+        changes.append(
+            {
+                "status": "added",
+                "image_id": ann["image_id"],
+                "new_id": ann["id"],
+                "new_category_id": ann["category_id"],
+                "new_bbox": ann.get("bbox"),
+            }
+        )
+    for i in removed.tolist():
+        ann = old_anns[i]
+        changes.append(
+            {
+                "status": "removed",
+                "image_id": int(old_images[i]) if old_images[i] >= 0 else None,
+                "old_id": ann["id"],
+                "old_category_id": ann["category_id"],
+                "old_bbox": ann.get("bbox"),
+            }
+        )
+    for status, mask in (("relabeled", relabeled), ("moved", moved)):
+        for i in np.flatnonzero(mask).tolist():
+            old_ann = old_anns[old_idx[i]]
+            new_ann = new_anns[new_idx[i]]
+            changes.append(
+                {
+                    "status": status,
+                    "image_id": new_ann["image_id"],
+                    "old_id": old_ann["id"],
+                    "new_id": new_ann["id"],
+                    "old_category_id": old_ann["category_id"],
+                    "new_category_id": new_ann["category_id"],
+                    "old_bbox": old_ann.get("bbox"),
+                    "new_bbox": new_ann.get("bbox"),
+                    "iou": float(ious[i]),
+                }
+            )
+
+    return {
+        "match_by": match_by,
+        "iou_threshold": iou_threshold,
+        "summary": {
+            "images_added": len(added_images),
+            "images_removed": len(removed_images),
+            "added": len(added),
+            "removed": len(removed),
+            "relabeled": int(np.count_nonzero(relabeled)),
+            "moved": int(np.count_nonzero(moved)),
+            "unchanged": int(len(old_idx) - np.count_nonzero(relabeled | moved)),
+        },
+        "images_added": [img["id"] for img in added_images],
+        "images_removed": [img["file_name"] for img in removed_images],
+        "changes": changes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two versions of a COCO annotation file."
+    )
+    parser.add_argument("old", help="Older annotation file")
+    parser.add_argument("new", help="Newer annotation file")
+    parser.add_argument(
+        "--match-by",
+        choices=["id", "key"],
+        default="id",
+        help="Join by IDs or by file name and geometry",
+    )
+    parser.add_argument("--iou", type=float, default=DIFF_IOU_THRESHOLD)
+    parser.add_argument("--output", help="Write the full report to this JSON file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.old, "r") as f:
+        old = json.load(f)
+    with open(args.new, "r") as f:
+        new = json.load(f)
+    loaded = time.perf_counter()
+    report = diff_datasets(old, new, args.match_by, args.iou)
+    end = time.perf_counter()
+
+    for name, value in report["summary"].items():
+        print(f"{name}: {value}")
+    print(f"Loaded in {loaded - start:.2f} s, compared in {end - loaded:.2f} s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import numpy as np
+
+from boxes import bbox_array, group_by_image, iou_matrix
+
+# Default IoU at or above which two boxes of the same category are duplicates
+DUPLICATE_IOU_THRESHOLD = 0.9
+
+# Default IoU at or above which two boxes of different categories conflict
+CONFLICT_IOU_THRESHOLD = 0.9
+
+# Maximum number of IoU values computed per batch, bounding the memory use
+PAIR_BATCH_SIZE = 1 << 22
+
+
+def dense_group_pairs(rows, boxes, min_iou):
+    """Find the overlapping pairs of one image with too many boxes for one batch.
+
+    The IoU matrix is computed in tiles of rows against all boxes of the image,
+    so no intermediate array exceeds PAIR_BATCH_SIZE elements.
+    """
+    size = len(rows)
+    group_boxes = boxes[rows]
+    tile_size = max(1, PAIR_BATCH_SIZE // size)
+    first = []
+    second = []
+    ious = []
+    for tile_start in range(0, size - 1, tile_size):
+        tile_rows = np.arange(tile_start, min(tile_start + tile_size, size))
+        # Only columns right of the tile's first row, each pair is computed once
+        cols = np.arange(tile_start + 1, size)
+        tile_ious = iou_matrix(group_boxes[tile_rows], group_boxes[cols])
+        upper = cols > tile_rows[:, None]
+        pair_rows, pair_cols = np.nonzero((tile_ious >= min_iou) & upper)
+        first.append(rows[tile_rows[pair_rows]])
+        second.append(rows[cols[pair_cols]])
+        ious.append(tile_ious[pair_rows, pair_cols])
+    return first, second, ious
+
+
+def overlapping_pairs(image_ids, boxes, min_iou):
+    """Find all pairs of boxes of the same image with IoU >= min_iou.
+
+    Boxes are grouped by image through a sorted index. Images with the same
+    number of boxes are stacked and their IoU matrices computed as one batch, so
+    there is no Python loop over images. Images whose IoU matrix alone exceeds
+    PAIR_BATCH_SIZE are computed in tiles. Returns the row indices of both boxes
+    of each pair, the first always the lower one, and their IoU.
+    """
+    order, starts, ends = group_by_image(image_ids)
+    sizes = ends - starts
+
+    first = []
+    second = []
+    ious = []
+    for size in np.unique(sizes[sizes > 1]).tolist():
+        group_starts = starts[sizes == size]
+        if size * size > PAIR_BATCH_SIZE:
+            for start in group_starts.tolist():
+                group_first, group_second, group_ious = dense_group_pairs(
+                    order[start : start + size], boxes, min_iou
+                )
+                first.extend(group_first)
+                second.extend(group_second)
+                ious.extend(group_ious)
+            continue
+
+        upper_rows, upper_cols = np.triu_indices(size, 1)
+        batch_size = max(1, PAIR_BATCH_SIZE // (size * size))
+        for batch in range(0, len(group_starts), batch_size):
+            batch_starts = group_starts[batch : batch + batch_size]
+            rows = order[batch_starts[:, None] + np.arange(size)]
+            group_boxes = boxes[rows]
+            pair_ious = iou_matrix(group_boxes, group_boxes)[:, upper_rows, upper_cols]
+            groups, pairs = np.nonzero(pair_ious >= min_iou)
+            first.append(rows[groups, upper_rows[pairs]])
+            second.append(rows[groups, upper_cols[pairs]])
+            ious.append(pair_ious[groups, pairs])
+
+    if not first:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    return np.concatenate(first), np.concatenate(second), np.concatenate(ious)
+
+
+def suppressed_rows(first, second):
+    """Return the rows suppressed greedily in row order, like non-maximum suppression.
+
+    `first` and `second` hold the rows of the duplicate pairs, with first < second.
+    A row is suppressed only if it duplicates an earlier row that is kept, so of
+    a chain of boxes that only overlap their neighbours every other box remains.
+    """
+    # Pairs sorted by their later row, so every earlier row is decided first
+    order = np.lexsort((first, second))
+    suppressed = set()
+    for row_a, row_b in zip(first[order].tolist(), second[order].tolist()):
+        if row_a not in suppressed:
+            suppressed.add(row_b)
+    return np.array(sorted(suppressed), dtype=np.int64)
+
+
+def find_overlaps(
+    anns,
+    duplicate_iou=DUPLICATE_IOU_THRESHOLD,
+    conflict_iou=CONFLICT_IOU_THRESHOLD,
+):
+    """Find duplicate boxes and cross-category conflicts in the annotations.
+
+    Duplicates are boxes of the same category with IoU >= duplicate_iou,
+    conflicts are boxes of different categories with IoU >= conflict_iou. Returns
+    a report listing every pair and the annotation rows that removing duplicates
+    would delete, see suppressed_rows().
+    """
+    image_ids = np.fromiter(
+        (ann["image_id"] for ann in anns), dtype=np.int64, count=len(anns)
+    )
+    category_ids = np.fromiter(
+        (ann["category_id"] for ann in anns), dtype=np.int64, count=len(anns)
+    )
+    ann_ids = np.fromiter((ann["id"] for ann in anns), dtype=np.int64, count=len(anns))
+    first, second, ious = overlapping_pairs(
+        image_ids, bbox_array(anns), min(duplicate_iou, conflict_iou)
+    )
+
+    same_category = category_ids[first] == category_ids[second]
+    duplicate = same_category & (ious >= duplicate_iou)
+    conflict = ~same_category & (ious >= conflict_iou)
+
+    def pair_entries(mask):
+        return [
+            {
+                "image_id": int(image_id),
+                "ann_ids": [int(id_a), int(id_b)],
+                "rows": [int(row_a), int(row_b)],
+                "category_ids": [int(cat_a), int(cat_b)],
+                "iou": float(iou),
+            }
+            for image_id, id_a, id_b, row_a, row_b, cat_a, cat_b, iou in zip(
+                image_ids[first[mask]],
+                ann_ids[first[mask]],
+                ann_ids[second[mask]],
+                first[mask],
+                second[mask],
+                category_ids[first[mask]],
+                category_ids[second[mask]],
+                ious[mask],
+            )
+        ]
+
+    # Rows rather than IDs, merged datasets may contain copies sharing an ID
+    redundant_rows = suppressed_rows(first[duplicate], second[duplicate])
+    return {
+        "duplicate_iou": duplicate_iou,
+        "conflict_iou": conflict_iou,
+        "duplicates": pair_entries(duplicate),
+        "conflicts": pair_entries(conflict),
+        "redundant_rows": redundant_rows.tolist(),
+    }
+
+
+def drop_rows(anns, rows):
+    """Return the annotations without the given row indices."""
+    rows = set(rows)
+    return [ann for row, ann in enumerate(anns) if row not in rows]
+
+
+def remove_duplicates(dataset, duplicate_iou=DUPLICATE_IOU_THRESHOLD):
+    """Remove same-category duplicate boxes from the dataset in place.
+
+    Annotations are kept in list order and every later annotation duplicating a
+    kept one is removed, so one annotation of each group of stacked boxes
+    remains. Returns the report.
+    """
+    report = find_overlaps(
+        dataset.get("annotations", []), duplicate_iou, conflict_iou=np.inf
+    )
+    if report["redundant_rows"]:
+        dataset["annotations"] = drop_rows(
+            dataset["annotations"], report["redundant_rows"]
+        )
+    return report
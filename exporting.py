@@ -0,0 +1,513 @@
+import io
+import json
+import math
+import os
+import re
+import tarfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from PIL import Image
+from pycocotools import mask as mask_utils
+
+from segmentation import is_polygon_segmentation, is_rle_segmentation
+
+# Output formats of the resized export, mapped to their file extension
+EXPORT_FORMATS = {"JPEG": ".jpg", "WEBP": ".webp", "PNG": ".png"}
+
+# Number of images handed to a worker process at once
+EXPORT_CHUNK_SIZE = 16
+
+# Default number of samples per tar shard
+TAR_SHARD_SIZE = 1000
+
+# Number of tasks queued per worker process, bounding the memory of the exports
+TASKS_IN_FLIGHT = 2
+
+# Shapes of the object crops
+CROP_SHAPES = ("box", "square", "letterbox")
+
+# Number of source images per crop export task and per crop tar shard
+CROP_TASK_SIZE = 200
+
+
+def output_relative_path(file_name, extension=None):
+    """Return a safe relative output path for an image, optionally with a new extension.
+
+    Subdirectories of the file name are kept to avoid collisions between images
+    with the same name; absolute paths and paths leaving the folder are flattened.
+    """
+    relative_path = os.path.normpath(file_name).replace("\\", "/")
+    if os.path.isabs(relative_path) or relative_path.startswith(".."):
+        relative_path = os.path.basename(relative_path)
+    if extension:
+        relative_path = os.path.splitext(relative_path)[0] + extension
+    return relative_path
+
+
+def rescale_rle(segmentation, height, width, new_height, new_width):
+    """Resize an RLE mask with nearest-neighbour sampling and encode it again."""
+    if isinstance(segmentation["counts"], list):
+        segmentation = mask_utils.frPyObjects(
+            segmentation, *segmentation.get("size", (height, width))
+        )
+    mask = mask_utils.decode(segmentation)
+    resized = Image.fromarray(mask * 255).resize((new_width, new_height), Image.NEAREST)
+    rle = mask_utils.encode(np.asfortranarray(np.asarray(resized) > 0, dtype=np.uint8))
+    rle["counts"] = rle["counts"].decode("ascii")
+    return rle
+
+
+def rescale_annotation(ann, scale_x, scale_y, height, width, new_height, new_width):
+    """Scale bbox, area and segmentation of an annotation in place."""
+    if isinstance(ann.get("bbox"), list) and len(ann["bbox"]) == 4:
+        x, y, w, h = ann["bbox"]
+        ann["bbox"] = [x * scale_x, y * scale_y, w * scale_x, h * scale_y]
+    if isinstance(ann.get("area"), (int, float)):
+        ann["area"] = ann["area"] * scale_x * scale_y
+
+    segmentation = ann.get("segmentation")
+    if is_polygon_segmentation(segmentation):
+        scaled = []
+        for poly in segmentation:
+            coords = np.asarray(poly, dtype=np.float64)
+            coords[0::2] *= scale_x
+            coords[1::2] *= scale_y
+            scaled.append(np.round(coords, 2).tolist())
+        ann["segmentation"] = scaled
+    elif is_rle_segmentation(segmentation):
+        ann["segmentation"] = rescale_rle(
+            segmentation, height, width, new_height, new_width
+        )
+    return ann
+
+
+def resize_image_task(task):
+    """Resize and transcode one image and rescale its annotations.
+
+    Runs in a worker process. Returns (image ID, new width, new height, rescaled
+    annotations) or (image ID, None, None, error message) if the image failed.
+    """
+    image_id, src_path, dst_path, anns, max_side, image_format, quality = task
+    try:
+        with Image.open(src_path) as image:
+            width, height = image.size
+            scale = 1.0
+            if max_side and max(width, height) > max_side:
+                scale = max_side / max(width, height)
+            new_width = max(1, round(width * scale))
+            new_height = max(1, round(height * scale))
+
+            # Let JPEG decoding do most of the downscaling
+            image.draft("RGB", (new_width, new_height))
+            if image_format == "JPEG" or image.mode not in ("RGB", "RGBA", "L"):
+                image = image.convert("RGB")
+            if image.size != (new_width, new_height):
+                image = image.resize((new_width, new_height), Image.LANCZOS)
+
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            save_options = {"quality": quality} if image_format != "PNG" else {}
+            image.save(dst_path, format=image_format, **save_options)
+    except Exception as e:
+        return image_id, None, None, str(e)
+
+    scale_x = new_width / width
+    scale_y = new_height / height
+    for ann in anns:
+        rescale_annotation(ann, scale_x, scale_y, height, width, new_height, new_width)
+    return image_id, new_width, new_height, anns
+
+
+def export_resized_dataset(
+    dataset,
+    image_id_to_path,
+    output_dir,
+    max_side=None,
+    image_format="JPEG",
+    quality=90,
+    max_workers=None,
+):
+    """Export the dataset with resized and transcoded images in a process pool.
+
+    Every worker task decodes, resizes and encodes one image and rescales the
+    annotations of that image, so images and annotations are processed in one
+    pass. Returns the written annotation file and the images that failed.
+    """
+    images_dir = os.path.join(output_dir, "images")
+    annotations_dir = os.path.join(output_dir, "annotations")
+    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(annotations_dir, exist_ok=True)
+
+    anns_by_image = {}
+    for ann in dataset.get("annotations", []):
+        anns_by_image.setdefault(ann["image_id"], []).append(ann)
+
+    extension = EXPORT_FORMATS[image_format]
+    images = {img["id"]: img for img in dataset.get("images", [])}
+    tasks = []
+    for img in images.values():
+        relative_path = output_relative_path(img["file_name"], extension)
+        tasks.append(
+            (
+                img["id"],
+                image_id_to_path[img["id"]],
+                os.path.join(images_dir, relative_path),
+                anns_by_image.get(img["id"], []),
+                max_side,
+                image_format,
+                quality,
+            )
+        )
+
+    exported_images = []
+    exported_annotations = []
+    failed = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(resize_image_task, tasks, chunksize=EXPORT_CHUNK_SIZE)
+        for image_id, new_width, new_height, result in results:
+            img = images[image_id]
+            if new_width is None:
+                failed.append((img["file_name"], result))
+                continue
+            exported_images.append(
+                dict(
+                    img,
+                    file_name=output_relative_path(img["file_name"], extension),
+                    width=new_width,
+                    height=new_height,
+                )
+            )
+            exported_annotations.extend(result)
+
+    exported = {
+        key: value
+        for key, value in dataset.items()
+        if key not in ("images", "annotations")
+    }
+    exported["images"] = exported_images
+    exported["annotations"] = exported_annotations
+
+    annotations_file = os.path.join(annotations_dir, "instances.json")
+    with open(annotations_file, "w") as f:
+        json.dump(exported, f)
+
+    return annotations_file, failed
+
+
+def write_tar_shard(task):
+    """Write one tar shard of image/annotation pairs. Runs in a worker process.
+
+    The images are streamed from their source files into the archive. The shard
+    is written to a temporary file first, so incomplete shards never appear.
+    Returns the shard file name, its image IDs, its size in bytes and the image
+    paths that could not be read.
+    """
+    shard_path, samples = task
+    tmp_path = shard_path + ".tmp"
+    image_ids = []
+    failed = []
+    with tarfile.open(tmp_path, "w") as tar:
+        for key, image_path, sample in samples:
+            extension = os.path.splitext(image_path)[1].lower()
+            try:
+                with open(image_path, "rb") as f:
+                    # fstat-based info stores symlinked images as regular files
+                    info = tar.gettarinfo(arcname=key + extension, fileobj=f)
+                    tar.addfile(info, f)
+            except OSError:
+                failed.append(image_path)
+                continue
+
+            data = json.dumps(sample).encode("utf-8")
+            info = tarfile.TarInfo(key + ".json")
+            info.size = len(data)
+            info.mtime = int(os.path.getmtime(image_path))
+            tar.addfile(info, io.BytesIO(data))
+            image_ids.append(sample["image"]["id"])
+    os.replace(tmp_path, shard_path)
+    return os.path.basename(shard_path), image_ids, os.path.getsize(shard_path), failed
+
+
+def run_bounded(function, tasks, max_workers=None):
+    """Run tasks in a process pool, keeping only a few tasks per worker queued.
+
+    The tasks are consumed lazily, so a task generator never materializes the
+    whole dataset. Returns the results in completion order.
+    """
+    max_workers = max_workers or os.cpu_count()
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for task in tasks:
+            if len(pending) >= max_workers * TASKS_IN_FLIGHT:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+            pending.add(executor.submit(function, task))
+        results.extend(future.result() for future in pending)
+    return results
+
+
+def iter_tar_shard_tasks(coco, image_path_for, output_dir, shard_size):
+    """Yield the shard tasks of a dataset, loading one shard of samples at a time."""
+    img_ids = coco.getImgIds()
+    num_shards = (len(img_ids) + shard_size - 1) // shard_size
+    digits = max(6, len(str(num_shards)))
+    for shard_index, start in enumerate(range(0, len(img_ids), shard_size)):
+        samples = []
+        for img in coco.loadImgs(img_ids[start : start + shard_size]):
+            anns = coco.loadAnns(coco.getAnnIds(imgIds=img["id"]))
+            # Keys must not contain dots, which separate key and extension
+            key = f"{img['id']:012d}"
+            samples.append(
+                (key, image_path_for(img), {"image": img, "annotations": anns})
+            )
+        shard_path = os.path.join(output_dir, f"shard-{shard_index:0{digits}d}.tar")
+        yield shard_path, samples
+
+
+def export_tar_shards(
+    coco, image_path_for, output_dir, shard_size=TAR_SHARD_SIZE, max_workers=None
+):
+    """Export the dataset as WebDataset-style tar shards plus a shard index.
+
+    Every sample of a shard consists of '<key>.<image extension>' and
+    '<key>.json' with the image entry and its annotations. Shards are written in
+    a process pool while only a few shards per worker are loaded at a time, which
+    keeps memory bounded for datasets of any size. Works with both COCO and
+    SQLiteCOCO. Returns the path of the written index file and the image paths
+    that could not be read.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = iter_tar_shard_tasks(coco, image_path_for, output_dir, shard_size)
+    shards = sorted(run_bounded(write_tar_shard, tasks, max_workers))
+    index = {
+        "num_samples": sum(len(image_ids) for _, image_ids, _, _ in shards),
+        "categories": coco.loadCats(coco.getCatIds()),
+        "shards": [
+            {
+                "file_name": file_name,
+                "num_samples": len(image_ids),
+                "size": size,
+                "image_ids": image_ids,
+            }
+            for file_name, image_ids, size, _ in shards
+        ],
+    }
+    index_file = os.path.join(output_dir, "index.json")
+    with open(index_file, "w") as f:
+        json.dump(index, f)
+
+    failed = [path for _, _, _, shard_failed in shards for path in shard_failed]
+    return index_file, failed
+
+
+def category_folder_name(cat_id, name):
+    """Return a file system safe folder name for a category.
+
+    The category ID prefix keeps folders apart when sanitizing maps different
+    names to the same string, e.g. 'a/b' and 'a:b', or names differ only in case.
+    """
+    safe_name = re.sub(r"[^\w\-. ]+", "_", name).strip(" .")
+    return f"{cat_id}_{safe_name}" if safe_name else str(cat_id)
+
+
+def crop_box(bbox, padding, shape):
+    """Return the (left, top, right, bottom) crop region of a bbox.
+
+    The bbox is grown by 'padding' times its size on every side. The 'square'
+    shape grows the shorter side around the center to make the region square.
+    The region is rounded outwards to whole pixels and is at least one pixel.
+    """
+    x, y, w, h = bbox
+    pad_x = w * padding
+    pad_y = h * padding
+    left, top, right, bottom = x - pad_x, y - pad_y, x + w + pad_x, y + h + pad_y
+    if shape == "square":
+        side = max(right - left, bottom - top)
+        center_x = (left + right) / 2
+        center_y = (top + bottom) / 2
+        left, right = center_x - side / 2, center_x + side / 2
+        top, bottom = center_y - side / 2, center_y + side / 2
+    left, top = math.floor(left), math.floor(top)
+    right, bottom = math.ceil(right), math.ceil(bottom)
+    return left, top, max(right, left + 1), max(bottom, top + 1)
+
+
+def make_crop(image, bbox, padding, shape, output_size):
+    """Crop one object from a decoded image.
+
+    Regions reaching beyond the image are filled with black. 'letterbox' pads the
+    crop to a square without distorting it. With an output size, square crops are
+    resized to output_size x output_size and others to a longest side of it.
+    """
+    crop = image.crop(crop_box(bbox, padding, shape))
+    if shape == "letterbox":
+        side = max(crop.size)
+        canvas = Image.new("RGB", (side, side))
+        canvas.paste(crop, ((side - crop.width) // 2, (side - crop.height) // 2))
+        crop = canvas
+    if output_size:
+        if shape == "box":
+            crop.thumbnail((output_size, output_size), Image.LANCZOS)
+        else:
+            crop = crop.resize((output_size, output_size), Image.LANCZOS)
+    return crop
+
+
+def export_crops_task(task):
+    """Crop all objects of a chunk of images. Runs in a worker process.
+
+    Every source image is decoded once for all of its boxes. The crops are
+    written as JPEG files to per-category folders or, if 'shard_path' is set,
+    to one tar shard with '<key>.jpg', '<key>.cls' and '<key>.json' per crop.
+    Returns the number of crops per category ID and the unreadable image paths
+    and crops that could not be encoded.
+    """
+    images, output_dir, shard_path, padding, shape, output_size, quality = task
+    counts = {}
+    failed = []
+    tmp_path = shard_path + ".tmp" if shard_path else None
+    tar = tarfile.open(tmp_path, "w") if shard_path else None
+    try:
+        for image_path, crops in images:
+            try:
+                with Image.open(image_path) as image:
+                    image = image.convert("RGB")
+            except OSError:
+                failed.append(image_path)
+                continue
+
+            for meta, folder in crops:
+                try:
+                    crop = make_crop(image, meta["bbox"], padding, shape, output_size)
+                    buffer = io.BytesIO()
+                    crop.save(buffer, format="JPEG", quality=quality)
+                except (OSError, ValueError) as e:
+                    failed.append(
+                        f"{image_path} (annotation {meta['annotation_id']}: {e})"
+                    )
+                    continue
+
+                if tar:
+                    # Keys must not contain dots, which separate key and extension
+                    key = f"{meta['annotation_id']:012d}"
+                    for extension, data in (
+                        ("jpg", buffer.getvalue()),
+                        ("cls", str(meta["category_id"]).encode("utf-8")),
+                        ("json", json.dumps(meta).encode("utf-8")),
+                    ):
+                        info = tarfile.TarInfo(f"{key}.{extension}")
+                        info.size = len(data)
+                        tar.addfile(info, io.BytesIO(data))
+                else:
+                    crop_file = os.path.join(
+                        output_dir, folder, f"{meta['annotation_id']}.jpg"
+                    )
+                    with open(crop_file, "wb") as f:
+                        f.write(buffer.getvalue())
+                counts[meta["category_id"]] = counts.get(meta["category_id"], 0) + 1
+    except BaseException:
+        # Never publish an incomplete shard under its final name
+        if tar:
+            tar.close()
+            os.remove(tmp_path)
+        raise
+    if tar:
+        tar.close()
+        os.replace(tmp_path, shard_path)
+    return counts, failed
+
+
+def export_crops(
+    coco,
+    image_path_for,
+    output_dir,
+    padding=0.0,
+    shape="box",
+    output_size=None,
+    min_size=0,
+    cat_ids=None,
+    as_tar_shards=False,
+    quality=95,
+    max_workers=None,
+):
+    """Export every annotation box as an image crop for classifier training.
+
+    Boxes smaller than 'min_size' pixels on either side and categories outside
+    'cat_ids' are skipped. Crops go to one folder per category or to tar shards
+    of CROP_TASK_SIZE source images each. Work is spread over a process pool with
+    a bounded number of queued tasks; works with both COCO and SQLiteCOCO.
+    Returns the number of crops per category ID and the unreadable image paths.
+    """
+    cats = {cat["id"]: cat for cat in coco.loadCats(coco.getCatIds())}
+    cat_ids = [cat_id for cat_id in (cat_ids or cats) if cat_id in cats]
+    folders = {
+        cat_id: category_folder_name(cat_id, cats[cat_id]["name"]) for cat_id in cats
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    if not as_tar_shards:
+        for cat_id in cat_ids:
+            os.makedirs(os.path.join(output_dir, folders[cat_id]), exist_ok=True)
+
+    # Only filter annotations by category if a subset of categories was chosen
+    ann_cat_ids = cat_ids if len(cat_ids) < len(cats) else []
+
+    def iter_tasks():
+        img_ids = coco.getImgIds() if cat_ids else []
+        shard_index = 0
+        for start in range(0, len(img_ids), CROP_TASK_SIZE):
+            images = []
+            for img in coco.loadImgs(img_ids[start : start + CROP_TASK_SIZE]):
+                crops = []
+                for ann in coco.loadAnns(
+                    coco.getAnnIds(imgIds=img["id"], catIds=ann_cat_ids)
+                ):
+                    bbox = ann.get("bbox")
+                    if not bbox or min(bbox[2], bbox[3]) < max(min_size, 1):
+                        continue
+                    meta = {
+                        "annotation_id": ann["id"],
+                        "image_id": img["id"],
+                        "category_id": ann["category_id"],
+                        "category": cats[ann["category_id"]]["name"],
+                        "bbox": bbox,
+                    }
+                    crops.append((meta, folders[ann["category_id"]]))
+                if crops:
+                    images.append((image_path_for(img), crops))
+            if not images:
+                continue
+            shard_path = None
+            if as_tar_shards:
+                shard_path = os.path.join(output_dir, f"crops-{shard_index:06d}.tar")
+                shard_index += 1
+            yield images, output_dir, shard_path, padding, shape, output_size, quality
+
+    counts = {}
+    failed = []
+    for task_counts, task_failed in run_bounded(
+        export_crops_task, iter_tasks(), max_workers
+    ):
+        for cat_id, count in task_counts.items():
+            counts[cat_id] = counts.get(cat_id, 0) + count
+        failed.extend(task_failed)
+
+    with open(os.path.join(output_dir, "index.json"), "w") as f:
+        json.dump(
+            {
+                "categories": [
+                    dict(
+                        cats[cat_id],
+                        folder=folders[cat_id],
+                        num_crops=counts.get(cat_id, 0),
+                    )
+                    for cat_id in cat_ids
+                ],
+                "padding": padding,
+                "shape": shape,
+                "output_size": output_size,
+            },
+            f,
+        )
+
+    return counts, failed
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# File extensions considered images when scanning an image folder
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp", ".gif"}
+
+# Directory for the persistent image folder indexes
+INDEX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "coco_dataset_doctor")
+
+# Number of threads scanning directories in parallel
+SCAN_WORKERS = 16
+
+# Version of the cache layout, caches of other versions are rebuilt
+INDEX_VERSION = 1
+
+
+def normalize_relative_path(path):
+    """Normalize a relative path to forward slashes without leading './'."""
+    path = os.path.normpath(path).replace("\\", "/")
+    return "" if path == "." else path
+
+
+def scan_directory(path):
+    """List the image files and subdirectories of one directory."""
+    files = []
+    subdirs = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                files.append(entry.name)
+    return {"mtime": os.stat(path).st_mtime_ns, "files": files, "subdirs": subdirs}
+
+
+def scan_existing_directory(path):
+    """Scan a directory, returning None if it no longer exists."""
+    try:
+        return scan_directory(path)
+    except OSError:
+        return None
+
+
+def directory_mtime(path):
+    """Return the modification time of a directory or None if it is gone."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ImagePathIndex:
+    """Persistent index of the image files below an image folder.
+
+    The folder is scanned once with parallel os.scandir calls. Later loads only
+    re-scan directories whose modification time changed. File names of the
+    annotation file are resolved by relative path first, then by basename, using
+    the longest matching path suffix to pick between files with the same name.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.directories = {}
+        self.by_basename = {}
+        self.relative_paths = set()
+
+    @property
+    def cache_path(self):
+        digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(INDEX_CACHE_DIR, f"{digest}.json")
+
+    def absolute(self, relative_dir):
+        return os.path.join(self.root, relative_dir) if relative_dir else self.root
+
+    def scan(self, relative_dirs):
+        """Scan the given directories and all their subdirectories in parallel."""
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+            pending = {
+                executor.submit(
+                    scan_directory, self.absolute(relative_dir)
+                ): relative_dir
+                for relative_dir in relative_dirs
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relative_dir = pending.pop(future)
+                    try:
+                        entry = future.result()
+                    except OSError:
+                        self.directories.pop(relative_dir, None)
+                        continue
+                    self.directories[relative_dir] = entry
+                    for subdir in entry["subdirs"]:
+                        relative_subdir = normalize_relative_path(
+                            os.path.join(relative_dir, subdir)
+                        )
+                        pending[
+                            executor.submit(
+                                scan_directory, self.absolute(relative_subdir)
+                            )
+                        ] = relative_subdir
+
+    def refresh(self):
+        """Re-scan only directories whose modification time changed.
+
+        A directory's mtime changes when entries are added, removed or renamed
+        directly inside it, so unchanged directories keep their cached listing.
+        Returns the number of changed directories.
+        """
+        relative_dirs = list(self.directories)
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+            mtimes = list(
+                executor.map(directory_mtime, map(self.absolute, relative_dirs))
+            )
+            changed = [
+                relative_dir
+                for relative_dir, mtime in zip(relative_dirs, mtimes)
+                if mtime != self.directories[relative_dir]["mtime"]
+            ]
+            entries = list(
+                executor.map(scan_existing_directory, map(self.absolute, changed))
+            )
+
+        new_dirs = []
+        for relative_dir, entry in zip(changed, entries):
+            old_subdirs = set(self.directories.get(relative_dir, {}).get("subdirs", []))
+            if entry is None:
+                # Directory was removed, drop it with its subtree
+                self.drop_subtree(relative_dir)
+                continue
+            for subdir in old_subdirs - set(entry["subdirs"]):
+                self.drop_subtree(
+                    normalize_relative_path(os.path.join(relative_dir, subdir))
+                )
+            for subdir in set(entry["subdirs"]) - old_subdirs:
+                new_dirs.append(
+                    normalize_relative_path(os.path.join(relative_dir, subdir))
+                )
+            self.directories[relative_dir] = entry
+
+        if new_dirs:
+            self.scan(new_dirs)
+        return len(changed)
+
+    def drop_subtree(self, relative_dir):
+        """Remove a directory and all its subdirectories from the index."""
+        prefix = relative_dir + "/"
+        for known_dir in list(self.directories):
+            if known_dir == relative_dir or known_dir.startswith(prefix):
+                del self.directories[known_dir]
+
+    def build_lookup(self):
+        """Build the relative path and basename lookups from the scanned directories."""
+        self.by_basename = {}
+        self.relative_paths = set()
+        for relative_dir, entry in self.directories.items():
+            for file_name in entry["files"]:
+                relative_path = (
+                    f"{relative_dir}/{file_name}" if relative_dir else file_name
+                )
+                self.relative_paths.add(relative_path)
+                self.by_basename.setdefault(file_name, []).append(relative_path)
+
+    def load(self):
+        """Load the index from the cache, refreshing or building it as needed."""
+        try:
+            with open(self.cache_path, "r") as f:
+                cache = json.load(f)
+            if cache.get("version") != INDEX_VERSION or cache.get("root") != self.root:
+                raise ValueError("Stale image index cache")
+            self.directories = cache["directories"]
+            changed = self.refresh()
+        except (OSError, ValueError, KeyError):
+            self.directories = {}
+            self.scan([""])
+            changed = True
+
+        self.build_lookup()
+        if changed:
+            self.save()
+        return self
+
+    def save(self):
+        """Write the index to the cache directory."""
+        try:
+            os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+            with open(self.cache_path, "w") as f:
+                json.dump(
+                    {
+                        "version": INDEX_VERSION,
+                        "root": self.root,
+                        "directories": self.directories,
+                    },
+                    f,
+                )
+        except OSError as e:
+            print(f"Failed to save image index: {e}")
+
+    def resolve(self, file_name):
+        """Resolve a 'file_name' entry to an absolute path.
+
+        Returns (path, status) with status 'ok', 'ambiguous' or 'missing'. If the
+        file cannot be resolved, the path is the plain join with the root.
+        """
+        fallback = os.path.join(self.root, file_name)
+        if os.path.isabs(file_name) and os.path.isfile(file_name):
+            return file_name, "ok"
+
+        relative_path = normalize_relative_path(file_name)
+        if relative_path in self.relative_paths:
+            return self.absolute(relative_path), "ok"
+
+        candidates = self.by_basename.get(os.path.basename(relative_path), [])
+        if len(candidates) == 1:
+            return self.absolute(candidates[0]), "ok"
+        if not candidates:
+            return fallback, "missing"
+
+        # Prefer the candidates sharing the longest trailing path with the file name
+        parts = relative_path.split("/")
+        best_length = 0
+        best = []
+        for candidate in candidates:
+            candidate_parts = candidate.split("/")
+            length = 0
+            while (
+                length < min(len(parts), len(candidate_parts))
+                and parts[-1 - length] == candidate_parts[-1 - length]
+            ):
+                length += 1
+            if length > best_length:
+                best_length, best = length, [candidate]
+            elif length == best_length:
+                best.append(candidate)
+        if len(best) == 1:
+            return self.absolute(best[0]), "ok"
+        return self.absolute(sorted(best)[0]), "ambiguous"
+
+    def resolve_images(self, images):
+        """Resolve the paths of all images in bulk.
+
+        Returns the image ID to path mapping and the file names that were missing
+        or ambiguous.
+        """
+        image_id_to_path = {}
+        problems = {"missing": [], "ambiguous": []}
+        for img in images:
+            path, status = self.resolve(img["file_name"])
+            image_id_to_path[img["id"]] = path
+            if status != "ok":
+                problems[status].append(img["file_name"])
+        return image_id_to_path, problems
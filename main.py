@@ -2,17 +2,88 @@ import os
 import random
 import json
 import shutil
+import time
 
+import numpy as np
 from PIL import Image, ImageTk, ImageDraw, ImageFont
 from pycocotools.coco import COCO
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox
 
+from category_matching import (
+    ADD_AS_NEW,
+    DROP,
+    build_translation_table,
+    count_annotations_per_category,
+    default_decisions,
+    load_alias_table,
+    match_categories,
+    remap_ids,
+)
+from dataset_diff import DIFF_IOU_THRESHOLD, DIFF_STATUSES, diff_datasets
+from duplicates import (
+    CONFLICT_IOU_THRESHOLD,
+    DUPLICATE_IOU_THRESHOLD,
+    drop_rows,
+    find_overlaps,
+)
+from exporting import (
+    CROP_SHAPES,
+    EXPORT_FORMATS,
+    TAR_SHARD_SIZE,
+    export_crops,
+    export_resized_dataset,
+    export_tar_shards,
+    output_relative_path,
+)
+from image_index import ImagePathIndex
+from navigation import JumpIndex
+from segmentation import (
+    MaskOverlayCache,
+    build_label_map,
+    composite_label_map,
+    recompute_geometry,
+)
+from sharded_loading import is_shard_source, load_sharded_dataset
+from splitting import DEFAULT_SPLITS, stratified_split, write_splits
+from sqlite_dataset import SQLiteCOCO
+from tiled_viewer import ZOOM_STEP, ZoomView
+from tracing import traced, tracer
+
 # Initialize customtkinter
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
 
+# Maximum size of the displayed image
+DISPLAY_SIZE = (800, 600)
+
+# Maximum number of pixels of an image, raised for gigapixel dataset images
+MAX_IMAGE_PIXELS = 1 << 34
+
+# Maximum number of visible boxes drawn with a category label when zoomed in
+MAX_LABELED_BOXES = 300
+
+# Opacity of segmentation mask overlays
+MASK_ALPHA = 0.45
+
+# Shard filter entry showing all images
+ALL_SHARDS = "All Shards"
+
+# Review navigation entry showing all images
+ALL_IMAGES = "All Images"
+
+# Pause in navigation requests after which the latest requested image is shown
+NAVIGATION_DEBOUNCE_MS = 30
+
+# Maximum delay of a requested render while navigation requests keep arriving
+NAVIGATION_MAX_DELAY_MS = 250
+
+# Number of images skipped by the Page Up and Page Down shortcuts
+NAVIGATION_PAGE_STEP = 100
+
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
 
 class CocoDatasetGUI(ctk.CTk):
     def __init__(self):
@@ -22,20 +93,7 @@ class CocoDatasetGUI(ctk.CTk):
         self.geometry("1700x1000")  # Increased width to accommodate textboxes
 
         # Initialize dataset variables
-        self.coco = None
-        self.image_folder = None
-        self.image_ids = []
-        self.current_index = 0
-        self.annotation_file = None  # Store the original annotation file path
-
-        self.dataset_info = "<INFO PLACEHOLDER>"
-
-        # Class colors
-        self.class_colors = {}
-        self.classes = []
-
-        # Image ID to file path mapping
-        self.image_id_to_path = {}
+        self.init_dataset_state()
 
         # Load recent paths
         self.recent_paths = {}
@@ -44,6 +102,9 @@ class CocoDatasetGUI(ctk.CTk):
         # Setup GUI elements
         self.setup_gui()
 
+        # Show the duration of every operation in the status label
+        tracer.listeners.append(self.update_status_label)
+
         # Attempt to load dataset if recent paths are available
         if (
             "annotation_file" in self.recent_paths
@@ -57,6 +118,49 @@ class CocoDatasetGUI(ctk.CTk):
             except Exception as e:
                 print(f"Failed to load recent dataset: {e}")
 
+    def init_dataset_state(self):
+        """Initialize the dataset variables independent of any widgets."""
+        self.coco = None
+        self.image_folder = None
+        self.image_ids = []
+        self.current_index = 0
+        self.annotation_file = None  # Store the original annotation file path
+
+        self.dataset_info = "<INFO PLACEHOLDER>"
+
+        # Class colors
+        self.class_colors = {}
+        self.classes = []
+
+        # Image ID to file path mapping
+        self.image_id_to_path = {}
+
+        # Image ID to annotation shard name mapping (sharded datasets only)
+        self.image_id_to_shard = {}
+
+        # Index of the image folder and file names that could not be resolved
+        self.image_index = None
+        self.path_problems = {"missing": [], "ambiguous": []}
+
+        # Image ID lists to review by name and review notes per image ID
+        self.review_sets = {}
+        self.review_notes = {}
+
+        # Decoded segmentation masks per image at display resolution
+        self.mask_cache = MaskOverlayCache()
+
+        # Zoomed view of the current image, None while the whole image is shown
+        self.zoom_view = None
+        self.display_size = DISPLAY_SIZE
+        self.pan_anchor = None
+
+        # Scheduled render of the latest navigation target and when it was requested
+        self.pending_render = None
+        self.render_requested_at = 0.0
+
+        # Lookup of navigation positions, built on the first jump
+        self.jump_index = None
+
     def setup_gui(self):
         """Set up the main GUI components."""
         self.create_main_frames()
@@ -64,6 +168,7 @@ class CocoDatasetGUI(ctk.CTk):
         self.create_content_area()
         self.create_bottom_info_area()
         self.create_control_buttons()
+        self.bind_navigation_keys()
 
     def create_main_frames(self):
         """Create the main frames for the GUI."""
@@ -81,6 +186,10 @@ class CocoDatasetGUI(ctk.CTk):
         self.image_index_label = ctk.CTkLabel(master=self.top_frame, text="Image 0/0")
         self.image_index_label.pack(side="left", padx=10)
 
+        # Status label showing the timing of the last operation
+        self.status_label = ctk.CTkLabel(master=self.top_frame, text="")
+        self.status_label.pack(side="left", padx=10)
+
         # Navigation buttons frame
         self.nav_frame = ctk.CTkFrame(master=self.top_frame)
         self.nav_frame.pack(side="right", padx=10)
@@ -97,6 +206,67 @@ class CocoDatasetGUI(ctk.CTk):
         )
         self.next_button.grid(row=0, column=1, padx=5)
 
+        # Toggle for segmentation mask overlays
+        self.show_masks_var = tk.BooleanVar(value=False)
+        self.show_masks_checkbox = ctk.CTkCheckBox(
+            master=self.nav_frame,
+            text="Show Masks",
+            variable=self.show_masks_var,
+            command=lambda: self.display_sample(self.current_index),
+        )
+        self.show_masks_checkbox.grid(row=0, column=2, padx=5)
+
+        # Filter navigation by annotation shard
+        self.shard_filter_menu = ctk.CTkOptionMenu(
+            master=self.nav_frame,
+            values=[ALL_SHARDS],
+            command=self.apply_shard_filter,
+            state="disabled",
+        )
+        self.shard_filter_menu.grid(row=0, column=3, padx=5)
+
+        # Navigate the images flagged by a diff or cleanup operation
+        self.review_menu = ctk.CTkOptionMenu(
+            master=self.nav_frame,
+            values=[ALL_IMAGES],
+            command=self.apply_review_filter,
+            state="disabled",
+        )
+        self.review_menu.grid(row=0, column=4, padx=5)
+
+        # Jump to a position, image ID or file name
+        self.jump_entry = ctk.CTkEntry(
+            master=self.nav_frame, placeholder_text="#index, id:ID or file name"
+        )
+        self.jump_entry.grid(row=0, column=5, padx=5)
+        self.jump_entry.bind("<Return>", lambda event: self.jump_to_image())
+        self.jump_button = ctk.CTkButton(
+            master=self.nav_frame, text="Jump", width=60, command=self.jump_to_image
+        )
+        self.jump_button.grid(row=0, column=6, padx=5)
+
+    def bind_navigation_keys(self):
+        """Bind the keyboard shortcuts for browsing the images."""
+        shortcuts = {
+            "<Right>": lambda: self.step_sample(1),
+            "<Left>": lambda: self.step_sample(-1),
+            "<Next>": lambda: self.step_sample(NAVIGATION_PAGE_STEP, wrap=False),
+            "<Prior>": lambda: self.step_sample(-NAVIGATION_PAGE_STEP, wrap=False),
+            "<Home>": lambda: self.go_to_sample(0),
+            "<End>": lambda: self.go_to_sample(len(self.image_ids) - 1),
+        }
+        for sequence, action in shortcuts.items():
+            self.bind(
+                sequence, lambda event, action=action: self.run_shortcut(event, action)
+            )
+        self.bind("<Control-g>", lambda event: self.jump_entry.focus_set())
+
+    def run_shortcut(self, event, action):
+        """Run a navigation shortcut unless a text field has the focus."""
+        if isinstance(event.widget, (tk.Entry, tk.Text)):
+            return
+        action()
+
     def create_content_area(self):
         """Create the main content area for displaying images and annotations."""
         # Main content frame with three columns (image info, image, and annotation info)
@@ -107,6 +277,14 @@ class CocoDatasetGUI(ctk.CTk):
         self.image_label = ctk.CTkLabel(master=self.content_frame, text="")
         self.image_label.pack(side="left", padx=10, pady=10)
 
+        # Zoom with the mouse wheel, pan by dragging and double click to fit
+        self.image_label.bind("<MouseWheel>", self.zoom_image)
+        self.image_label.bind("<Button-4>", self.zoom_image)
+        self.image_label.bind("<Button-5>", self.zoom_image)
+        self.image_label.bind("<ButtonPress-1>", self.start_pan)
+        self.image_label.bind("<B1-Motion>", self.pan_image)
+        self.image_label.bind("<Double-Button-1>", self.reset_zoom)
+
         # Left Textbox for Image Info (non-scrollable)
         self.image_info_textbox = ctk.CTkTextbox(
             master=self.content_frame, width=400, height=400
@@ -151,6 +329,14 @@ class CocoDatasetGUI(ctk.CTk):
         )
         self.load_dataset_button.pack(side="left", padx=10)
 
+        # Load Sharded Dataset button
+        self.load_shards_button = ctk.CTkButton(
+            master=self.control_frame,
+            text="Load Sharded Dataset",
+            command=self.load_shards,
+        )
+        self.load_shards_button.pack(side="left", padx=10)
+
         # Merge Dataset button
         self.merge_dataset_button = ctk.CTkButton(
             master=self.control_frame,
@@ -207,6 +393,14 @@ class CocoDatasetGUI(ctk.CTk):
         )
         self.export_dataset_button.pack(side="left", padx=10)
 
+        # Export Tar Shards button
+        self.export_tar_shards_button = ctk.CTkButton(
+            master=self.control_frame,
+            text="Export Tar Shards",
+            command=self.export_tar_shards,
+        )
+        self.export_tar_shards_button.pack(side="left", padx=10)
+
         # Delete Current Image button
         self.delete_image_button = ctk.CTkButton(
             master=self.control_frame,
@@ -216,6 +410,127 @@ class CocoDatasetGUI(ctk.CTk):
         )
         self.delete_image_button.pack(side="left", padx=10)
 
+        # Second row for dataset cleanup and processing tools
+        self.tools_frame = ctk.CTkFrame(master=self.frame)
+        self.tools_frame.pack(pady=(0, 10), padx=10, fill="x")
+
+        # Recompute area and bbox button
+        self.recompute_geometry_button = ctk.CTkButton(
+            master=self.tools_frame,
+            text="Recompute Area/BBox",
+            command=self.recompute_geometry,
+        )
+        self.recompute_geometry_button.pack(side="left", padx=10)
+
+        # Split dataset button
+        self.split_dataset_button = ctk.CTkButton(
+            master=self.tools_frame,
+            text="Split Dataset",
+            command=self.split_dataset,
+        )
+        self.split_dataset_button.pack(side="left", padx=10)
+
+        # Export resized dataset button
+        self.export_resized_button = ctk.CTkButton(
+            master=self.tools_frame,
+            text="Export Resized",
+            command=self.export_resized_dataset,
+        )
+        self.export_resized_button.pack(side="left", padx=10)
+
+        # Diff with another version button
+        self.diff_button = ctk.CTkButton(
+            master=self.tools_frame,
+            text="Diff With Version",
+            command=self.diff_with_version,
+        )
+        self.diff_button.pack(side="left", padx=10)
+
+        # Find duplicate boxes button
+        self.find_duplicates_button = ctk.CTkButton(
+            master=self.tools_frame,
+            text="Find Duplicates",
+            command=self.find_duplicates,
+        )
+        self.find_duplicates_button.pack(side="left", padx=10)
+
+        # Export object crops button
+        self.export_crops_button = ctk.CTkButton(
+            master=self.tools_frame,
+            text="Export Crops",
+            command=self.export_crops,
+        )
+        self.export_crops_button.pack(side="left", padx=10)
+
+        # Toggle for recording a trace of all operations
+        self.tracing_var = tk.BooleanVar(value=tracer.enabled)
+        self.tracing_checkbox = ctk.CTkCheckBox(
+            master=self.tools_frame,
+            text="Enable Tracing",
+            variable=self.tracing_var,
+            command=self.toggle_tracing,
+        )
+        self.tracing_checkbox.pack(side="left", padx=10)
+
+        # Export trace button
+        self.export_trace_button = ctk.CTkButton(
+            master=self.tools_frame,
+            text="Export Trace",
+            command=self.export_trace,
+        )
+        self.export_trace_button.pack(side="left", padx=10)
+
+        # Toggle for loading datasets into an on-disk database
+        self.database_mode_var = tk.BooleanVar(
+            value=self.recent_paths.get("database_mode", False)
+        )
+        self.database_mode_checkbox = ctk.CTkCheckBox(
+            master=self.tools_frame,
+            text="Database Mode (out-of-core, read-only)",
+            variable=self.database_mode_var,
+        )
+        self.database_mode_checkbox.pack(side="left", padx=10)
+
+    def update_status_label(self, name, duration, counters):
+        """Show the timing of the last operation in the status label."""
+        text = f"Last operation: {name} ({duration * 1000:.1f} ms)"
+        if counters:
+            text += " - " + ", ".join(
+                f"{key}: {value}" for key, value in counters.items()
+            )
+        self.status_label.configure(text=text)
+
+    def toggle_tracing(self):
+        """Enable or disable recording of trace events."""
+        tracer.enabled = self.tracing_var.get()
+
+    def export_trace(self):
+        """Export the recorded trace as Chrome trace JSON file."""
+        if not tracer.events:
+            messagebox.showinfo(
+                "Info", "No trace events recorded. Enable tracing first."
+            )
+            return
+
+        output_file = filedialog.asksaveasfilename(
+            title="Save Trace File",
+            defaultextension=".json",
+            initialfile="dataset_doctor_trace.json",
+            filetypes=[("JSON Files", "*.json")],
+        )
+        if not output_file:
+            messagebox.showinfo("Info", "No output file selected.")
+            return
+
+        try:
+            tracer.export_chrome_trace(output_file)
+            messagebox.showinfo(
+                "Success",
+                f"Trace saved to {output_file} (open in chrome://tracing or Perfetto)",
+            )
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save trace: {e}")
+
     def load_recent_paths(self):
         """Load recent paths from a JSON file."""
         try:
@@ -269,20 +584,92 @@ class CocoDatasetGUI(ctk.CTk):
 
         self.load_dataset_from_paths(annotation_file, image_folder)
 
+    def load_shards(self):
+        """Load dataset by selecting a directory of annotation shards and image folder."""
+        recent_annotation_file = self.recent_paths.get("annotation_file", "")
+        recent_image_folder = self.recent_paths.get("image_folder", "")
+
+        # Directory dialog to select the shard directory
+        shard_dir = filedialog.askdirectory(
+            title="Select Directory with COCO Annotation Shards",
+            initialdir=(
+                os.path.dirname(recent_annotation_file)
+                if recent_annotation_file
+                else ""
+            ),
+        )
+        if not shard_dir:
+            messagebox.showerror("Error", "No shard directory selected.")
+            return
+
+        # Directory dialog to select image folder
+        image_folder = filedialog.askdirectory(
+            title="Select COCO Image Folder",
+            initialdir=recent_image_folder if recent_image_folder else "",
+        )
+        if not image_folder:
+            messagebox.showerror("Error", "No image folder selected.")
+            return
+
+        self.load_dataset_from_paths(shard_dir, image_folder)
+
+    @traced("load")
     def load_dataset_from_paths(self, annotation_file, image_folder):
-        """Load dataset from given annotation file and image folder paths."""
+        """Load dataset from given annotation file and image folder paths.
+
+        `annotation_file` may also be a directory or glob pattern of annotation
+        shards, which are loaded in parallel and merged into one dataset. In
+        database mode, the file is ingested into an SQLite database next to it and
+        data is paged in on demand.
+        """
         try:
-            self.coco = COCO(annotation_file)
+            # Parse into locals, so a failed load keeps the current dataset usable
+            with tracer.span("load.parse"):
+                if is_shard_source(annotation_file):
+                    dataset, image_id_to_shard, bytes_read = load_sharded_dataset(
+                        annotation_file
+                    )
+                    coco = COCO()
+                    coco.dataset = dataset
+                    coco.createIndex()
+                elif self.database_mode_var.get():
+                    coco = SQLiteCOCO(annotation_file)
+                    image_id_to_shard = {}
+                    bytes_read = 0
+                else:
+                    coco = COCO(annotation_file)
+                    image_id_to_shard = {}
+                    bytes_read = os.path.getsize(annotation_file)
+            tracer.count("bytes_read", bytes_read)
+
+            # Close the database of the previous dataset once the new one is loaded
+            previous_coco = self.coco
+            self.coco = coco
+            self.image_id_to_shard = image_id_to_shard
+            if isinstance(previous_coco, SQLiteCOCO):
+                previous_coco.close()
             self.annotation_file = annotation_file
             self.image_folder = image_folder
             self.image_ids = self.coco.getImgIds()
+            self.jump_index = None
             self.current_index = 0
+            self.mask_cache.invalidate()
 
-            # Map image IDs to file paths
+            # Map image IDs to file paths, resolved on demand in database mode
             self.image_id_to_path = {}
-            for img_info in self.coco.loadImgs(self.image_ids):
-                image_path = os.path.join(self.image_folder, img_info["file_name"])
-                self.image_id_to_path[img_info["id"]] = image_path
+            self.path_problems = {"missing": [], "ambiguous": []}
+            with tracer.span("load.resolve_paths"):
+                self.image_index = ImagePathIndex(image_folder).load()
+                if not self.is_database_mode():
+                    self.image_id_to_path, self.path_problems = (
+                        self.image_index.resolve_images(
+                            self.coco.loadImgs(self.image_ids)
+                        )
+                    )
+            self.update_shard_filter()
+            self.review_sets = {}
+            self.review_notes = {}
+            self.update_review_menu()
 
             # Get list of classes
             self.classes = [
@@ -301,10 +688,143 @@ class CocoDatasetGUI(ctk.CTk):
             # Save recent paths
             self.recent_paths["annotation_file"] = annotation_file
             self.recent_paths["image_folder"] = image_folder
+            self.recent_paths["database_mode"] = self.is_database_mode()
             self.save_recent_paths()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load dataset: {e}")
 
+    def is_database_mode(self):
+        """Return True if the current dataset is backed by an SQLite database."""
+        return isinstance(self.coco, SQLiteCOCO)
+
+    def require_in_memory_dataset(self):
+        """Return True if a dataset is loaded that can be modified, else inform the user."""
+        if not self.coco:
+            return False
+        if self.is_database_mode():
+            messagebox.showinfo(
+                "Info",
+                "This operation is not available in database mode. "
+                "Reload the dataset with database mode disabled to modify it.",
+            )
+            return False
+        return True
+
+    def image_path_for(self, img_info):
+        """Return the file path of an image."""
+        image_path = self.image_id_to_path.get(img_info["id"])
+        if image_path is None:
+            if self.image_index:
+                image_path, _ = self.image_index.resolve(img_info["file_name"])
+            else:
+                image_path = os.path.join(self.image_folder, img_info["file_name"])
+        return image_path
+
+    def iter_image_paths(self):
+        """Iterate over the (file name, file path) pairs of all images in the dataset."""
+        if self.is_database_mode():
+            for img_id, file_name in self.coco.iter_file_names():
+                yield file_name, self.image_path_for(
+                    {"id": img_id, "file_name": file_name}
+                )
+        else:
+            for img_id in self.coco.getImgIds():
+                yield self.coco.imgs[img_id]["file_name"], self.image_id_to_path[img_id]
+
+    def write_annotations(self, output_file):
+        """Write the current annotations to a COCO JSON file."""
+        if self.is_database_mode():
+            self.coco.write_json(output_file)
+        else:
+            with open(output_file, "w") as f:
+                json.dump(self.coco.dataset, f)
+
+    def update_shard_filter(self):
+        """Fill the shard filter with the shards of the loaded dataset."""
+        shard_names = sorted(set(self.image_id_to_shard.values()))
+        self.shard_filter_menu.configure(
+            values=[ALL_SHARDS] + shard_names,
+            state="normal" if shard_names else "disabled",
+        )
+        self.shard_filter_menu.set(ALL_SHARDS)
+
+    def apply_shard_filter(self, shard_name):
+        """Restrict navigation to the images of one annotation shard."""
+        self.review_menu.set(ALL_IMAGES)
+        if shard_name == ALL_SHARDS:
+            self.image_ids = self.coco.getImgIds()
+        else:
+            self.image_ids = [
+                image_id
+                for image_id in self.coco.getImgIds()
+                if self.image_id_to_shard.get(image_id) == shard_name
+            ]
+        self.current_index = 0
+        self.jump_index = None
+
+        if not self.image_ids:
+            self.reset_display()
+            return
+
+        self.update_image_index_label()
+        self.display_sample(self.current_index)
+
+    def update_review_menu(self):
+        """Fill the review navigation with the current review sets."""
+        self.review_menu.configure(
+            values=[ALL_IMAGES] + list(self.review_sets),
+            state="normal" if self.review_sets else "disabled",
+        )
+        self.review_menu.set(ALL_IMAGES)
+
+    def set_review_results(self, source, sets, notes):
+        """Replace the review sets and notes of one source, e.g. 'Diff'.
+
+        'sets' maps names to image ID lists and 'notes' maps image IDs to lines
+        shown with the image. Navigation jumps to the first non-empty set.
+        """
+        prefix = f"{source}: "
+        self.review_sets = {
+            name: image_ids
+            for name, image_ids in self.review_sets.items()
+            if not name.startswith(prefix)
+        }
+        for name, image_ids in sets.items():
+            self.review_sets[f"{prefix}{name} ({len(image_ids)})"] = image_ids
+        for image_notes in self.review_notes.values():
+            image_notes.pop(source, None)
+        for image_id, lines in notes.items():
+            self.review_notes.setdefault(image_id, {})[source] = lines
+
+        self.update_review_menu()
+        for name, image_ids in self.review_sets.items():
+            if name.startswith(prefix) and image_ids:
+                self.review_menu.set(name)
+                self.apply_review_filter(name)
+                break
+
+    def apply_review_filter(self, name):
+        """Restrict navigation to the images of one review set."""
+        self.shard_filter_menu.set(ALL_SHARDS)
+        if name == ALL_IMAGES:
+            self.image_ids = self.coco.getImgIds()
+        else:
+            existing_ids = set(self.coco.getImgIds())
+            self.image_ids = [
+                image_id
+                for image_id in self.review_sets[name]
+                if image_id in existing_ids
+            ]
+        self.current_index = 0
+        self.jump_index = None
+
+        if not self.image_ids:
+            self.reset_display()
+            return
+
+        self.update_image_index_label()
+        self.display_sample(self.current_index)
+
     def assign_class_colors(self):
         """Assign random colors to each class."""
         random.seed(42)  # For reproducibility
@@ -317,7 +837,7 @@ class CocoDatasetGUI(ctk.CTk):
 
     def delete_current_image(self):
         """Delete the current image and its annotations from the dataset."""
-        if not self.image_ids:
+        if not self.image_ids or not self.require_in_memory_dataset():
             return
 
         # Ask for confirmation
@@ -327,44 +847,55 @@ class CocoDatasetGUI(ctk.CTk):
         if not result:
             return
 
-        # Get the image ID and remove it from the dataset
-        current_image_id = self.image_ids[self.current_index]
+        with tracer.span("delete"):
+            # Get the image ID and remove it from the dataset
+            current_image_id = self.image_ids[self.current_index]
 
-        # Remove image from dataset
-        self.coco.dataset["images"] = [
-            img for img in self.coco.dataset["images"] if img["id"] != current_image_id
-        ]
+            # Remove image from dataset
+            self.coco.dataset["images"] = [
+                img
+                for img in self.coco.dataset["images"]
+                if img["id"] != current_image_id
+            ]
 
-        # Remove annotations for the current image
-        self.coco.dataset["annotations"] = [
-            ann
-            for ann in self.coco.dataset["annotations"]
-            if ann["image_id"] != current_image_id
-        ]
+            # Remove annotations for the current image
+            self.coco.dataset["annotations"] = [
+                ann
+                for ann in self.coco.dataset["annotations"]
+                if ann["image_id"] != current_image_id
+            ]
 
-        # Remove the image from image_ids and image_id_to_path
-        del self.image_id_to_path[current_image_id]
-        del self.image_ids[self.current_index]
+            # Remove the image from image_ids and image_id_to_path
+            del self.image_id_to_path[current_image_id]
+            del self.image_ids[self.current_index]
+            self.jump_index = None
+            self.mask_cache.invalidate(current_image_id)
 
-        # If there are no more images, reset the display
-        if not self.image_ids:
-            messagebox.showinfo("Info", "No more images in the dataset.")
-            self.reset_display()
-            return
+            # If there are no more images, reset the display
+            if not self.image_ids:
+                messagebox.showinfo("Info", "No more images in the dataset.")
+                self.reset_display()
+                return
 
-        # Adjust the current index if necessary
-        if self.current_index >= len(self.image_ids):
-            self.current_index = len(self.image_ids) - 1
+            # Adjust the current index if necessary
+            if self.current_index >= len(self.image_ids):
+                self.current_index = len(self.image_ids) - 1
 
-        # Rebuild the index after deletion
-        self.coco.createIndex()
+            # Rebuild the index after deletion
+            self.rebuild_index()
 
-        # Update the display
-        self.update_info_textbox()
-        self.display_sample(self.current_index)
+            # Update the display
+            self.update_info_textbox()
+            self.display_sample(self.current_index)
+
+    @traced("index_build")
+    def rebuild_index(self):
+        """Rebuild the COCO index after the dataset was modified."""
+        self.coco.createIndex()
 
     def reset_display(self):
         """Reset the display when no images are available."""
+        self.cancel_pending_render()
         self.image_label.configure(image="")
         self.image_index_label.configure(text="Image 0/0")
         self.dataset_info = ""
@@ -374,12 +905,24 @@ class CocoDatasetGUI(ctk.CTk):
 
     def update_info_textbox(self):
         """Update the dataset information textbox."""
-        num_total_annotations = len(self.coco.dataset["annotations"])
-        num_images = len(self.coco.dataset["images"])
+        if self.is_database_mode():
+            num_total_annotations = self.coco.count("annotations")
+            num_images = self.coco.count("images")
+        else:
+            num_total_annotations = len(self.coco.dataset["annotations"])
+            num_images = len(self.coco.dataset["images"])
 
         self.dataset_info = f"Number of images: {num_images}\n"
         self.dataset_info += f"Number of annotations: {num_total_annotations}\n"
 
+        # Report image files that could not be resolved unambiguously
+        for problem, file_names in self.path_problems.items():
+            if file_names:
+                examples = ", ".join(file_names[:3])
+                self.dataset_info += (
+                    f"Image paths {problem}: {len(file_names)} (e.g. {examples})\n"
+                )
+
         self.info_textbox.configure(state="normal")
         self.info_textbox.delete("1.0", tk.END)
         self.info_textbox.insert("1.0", self.dataset_info)
@@ -405,15 +948,17 @@ class CocoDatasetGUI(ctk.CTk):
         else:
             self.image_index_label.configure(text="Image 0/0")
 
+    @traced("render")
     def display_sample(self, index):
         """Display the image and annotations at the given index."""
+        self.cancel_pending_render()
         if not self.image_ids:
             return
+        self.zoom_view = None
 
         # Get image info
         img_info = self.coco.loadImgs(self.image_ids[index])[0]
-        image_id = img_info["id"]
-        image_path = self.image_id_to_path.get(image_id)
+        image_path = self.image_path_for(img_info)
 
         # Display image info
         self.display_image_info(img_info)
@@ -429,55 +974,62 @@ class CocoDatasetGUI(ctk.CTk):
         self.image_info_textbox.configure(state="normal")
         self.image_info_textbox.delete("1.0", tk.END)
         self.image_info_textbox.insert(tk.END, json.dumps(img_info, indent=4))
+        for source, lines in self.review_notes.get(img_info["id"], {}).items():
+            self.image_info_textbox.insert(
+                tk.END, f"\n\n{source}:\n" + "\n".join(lines)
+            )
         self.image_info_textbox.configure(state="disabled")
 
     def display_image_with_annotations(self, img_info, image_path):
         """Display the image with drawn annotations."""
         try:
-            image = Image.open(image_path).convert("RGB")
+            image = Image.open(image_path)
         except FileNotFoundError:
             messagebox.showerror("Error", f"Image file not found: {image_path}")
             return
 
-        # Draw annotations on the image
-        self.draw_annotations_on_image(image, img_info["id"])
+        # Decode directly at display resolution where the format supports it
+        with tracer.span("render.decode"):
+            original_width, original_height = image.size
+            image.draft("RGB", DISPLAY_SIZE)
+            image = image.convert("RGB")
+            image.thumbnail(DISPLAY_SIZE)
+        if tracer.enabled:
+            tracer.count("images_decoded")
+            tracer.count("bytes_read", os.path.getsize(image_path))
+
+        # Draw annotations on the resized image
+        scale = image.width / original_width
+        with tracer.span("render.annotations"):
+            self.draw_annotations_on_image(
+                image, img_info["id"], scale, (original_width, original_height)
+            )
 
-        # Resize and display the image
-        image.thumbnail((800, 600))
+        # Display the image
+        self.display_size = image.size
+        self.show_image(image)
+
+    def show_image(self, image):
+        """Show a rendered image in the image label."""
         self.photo = ImageTk.PhotoImage(image)
         self.image_label.configure(image=self.photo)
         self.image_label.image = self.photo
 
-    def draw_annotations_on_image(self, image, image_id):
-        """Draw annotations on the image."""
+    def draw_annotations_on_image(self, image, image_id, scale=1.0, original_size=None):
+        """Draw annotations on the image, scaling coordinates by the given factor."""
         ann_ids = self.coco.getAnnIds(imgIds=image_id)
         anns = self.coco.loadAnns(ann_ids)
+
+        # Overlay segmentation masks below the boxes
+        if self.show_masks_var.get() and anns:
+            self.draw_masks_on_image(image, image_id, anns, original_size or image.size)
+
         draw = ImageDraw.Draw(image)
         font = ImageFont.load_default()
 
         for ann in anns:
-            bbox = ann["bbox"]
-            x, y, w, h = bbox
-            cat_id = ann["category_id"]
-            color = self.class_colors.get(cat_id, (255, 0, 0))
-            outline_color = tuple(color)
-            draw.rectangle([x, y, x + w, y + h], outline=outline_color, width=2)
-
-            category_name = self.coco.loadCats(cat_id)[0]["name"]
-
-            label = f"{category_name}"
-
-            # Calculate text size
-            text_bbox = draw.textbbox((x, y), label, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
-
-            # Draw label rectangle
-            text_bg_rect = [x, y, x + text_width + 4, y + text_height + 4]
-            draw.rectangle(text_bg_rect, fill=outline_color)
-
-            # Draw text
-            draw.text((x + 2, y + 2), label, fill="black", font=font)
+            x, y, w, h = [value * scale for value in ann["bbox"]]
+            self.draw_labeled_box(draw, font, [x, y, x + w, y + h], ann["category_id"])
 
         # Display annotations in the right textbox
         self.annotation_textbox.configure(state="normal")
@@ -485,22 +1037,203 @@ class CocoDatasetGUI(ctk.CTk):
         self.annotation_textbox.insert(tk.END, json.dumps(anns, indent=4))
         self.annotation_textbox.configure(state="disabled")
 
-    def next_sample(self):
-        """Display the next image in the dataset."""
+    def draw_labeled_box(self, draw, font, box, cat_id, show_label=True):
+        """Draw an x0, y0, x1, y1 box in the class color with its category name."""
+        x, y = box[0], box[1]
+        color = self.class_colors.get(cat_id, (255, 0, 0))
+        outline_color = tuple(color)
+        draw.rectangle(box, outline=outline_color, width=2)
+        if not show_label:
+            return
+
+        category_name = self.coco.loadCats(cat_id)[0]["name"]
+
+        label = f"{category_name}"
+
+        # Calculate text size
+        text_bbox = draw.textbbox((x, y), label, font=font)
+        text_width = text_bbox[2] - text_bbox[0]
+        text_height = text_bbox[3] - text_bbox[1]
+
+        # Draw label rectangle
+        text_bg_rect = [x, y, x + text_width + 4, y + text_height + 4]
+        draw.rectangle(text_bg_rect, fill=outline_color)
+
+        # Draw text
+        draw.text((x + 2, y + 2), label, fill="black", font=font)
+
+    def draw_masks_on_image(self, image, image_id, anns, original_size):
+        """Blend the segmentation masks of the annotations onto the image."""
+        label_map = self.mask_cache.get(image_id, image.size)
+        if label_map is None:
+            tracer.count("mask_cache_misses")
+            original_width, original_height = original_size
+            with tracer.span("render.decode_masks"):
+                label_map = build_label_map(
+                    anns, original_width, original_height, image.width, image.height
+                )
+            self.mask_cache.put(image_id, image.size, label_map)
+        else:
+            tracer.count("mask_cache_hits")
+
+        colors = np.array(
+            [self.class_colors.get(ann["category_id"], (255, 0, 0)) for ann in anns],
+            dtype=np.uint8,
+        )
+        composite_label_map(image, label_map, colors, MASK_ALPHA)
+
+    def create_zoom_view(self):
+        """Create the zoomable view of the current image at the displayed size."""
+        img_info = self.coco.loadImgs(self.image_ids[self.current_index])[0]
+        anns = self.coco.loadAnns(self.coco.getAnnIds(imgIds=img_info["id"]))
+        try:
+            with tracer.span("render.index"):
+                return ZoomView(
+                    img_info["id"],
+                    self.image_path_for(img_info),
+                    anns,
+                    self.display_size,
+                )
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to open image: {e}")
+            return None
+
+    @traced("render_zoomed")
+    def render_zoom_view(self):
+        """Render the visible region of the zoomed image and its annotations.
+
+        Only the pyramid tiles and the annotations intersecting the viewport are
+        touched. Segmentation masks are only shown in the view of the whole image.
+        """
+        with tracer.span("render.tiles"):
+            image = self.zoom_view.render()
+
+        with tracer.span("render.annotations"):
+            anns, view_boxes = self.zoom_view.visible_annotations()
+            draw = ImageDraw.Draw(image)
+            font = ImageFont.load_default()
+            show_labels = len(anns) <= MAX_LABELED_BOXES
+            for ann, box in zip(anns, view_boxes.tolist()):
+                self.draw_labeled_box(draw, font, box, ann["category_id"], show_labels)
+
+        self.show_image(image)
+
+    def zoom_image(self, event):
+        """Zoom the displayed image in or out around the mouse pointer."""
         if not self.image_ids:
             return
-        self.current_index = (self.current_index + 1) % len(self.image_ids)
-        self.display_sample(self.current_index)
+        zoom_in = event.num == 4 or getattr(event, "delta", 0) > 0
+        if self.zoom_view is None:
+            if not zoom_in:
+                return
+            self.zoom_view = self.create_zoom_view()
+            if self.zoom_view is None:
+                return
+
+        factor = ZOOM_STEP if zoom_in else 1 / ZOOM_STEP
+        self.zoom_view.viewport.zoom_at(factor, event.x, event.y)
+        if self.zoom_view.viewport.is_fit():
+            self.reset_zoom()
+        else:
+            self.render_zoom_view()
+
+    def start_pan(self, event):
+        """Remember the mouse position where dragging the image starts."""
+        self.pan_anchor = (event.x, event.y)
+
+    def pan_image(self, event):
+        """Move the zoomed image along with the mouse."""
+        if self.zoom_view is None or self.pan_anchor is None:
+            return
+        x, y = self.pan_anchor
+        self.pan_anchor = (event.x, event.y)
+        self.zoom_view.viewport.pan(event.x - x, event.y - y)
+        self.render_zoom_view()
+
+    def reset_zoom(self, event=None):
+        """Return to the view of the whole image."""
+        if self.zoom_view is not None:
+            self.display_sample(self.current_index)
+
+    def request_display(self, index):
+        """Show the image at index, coalescing rapid requests into one render.
+
+        Every request cancels the scheduled render and schedules a new one, so
+        holding a navigation key only decodes the latest target once the requests
+        pause. While requests keep arriving, the scheduled render is kept once it
+        is older than NAVIGATION_MAX_DELAY_MS, so the view still follows along.
+        """
+        self.current_index = index
+        self.update_image_index_label()
+        now = time.monotonic()
+        if self.pending_render is None:
+            self.render_requested_at = now
+        elif (now - self.render_requested_at) * 1000 < NAVIGATION_MAX_DELAY_MS:
+            self.after_cancel(self.pending_render)
+        else:
+            return
+        self.pending_render = self.after(
+            NAVIGATION_DEBOUNCE_MS, self.render_pending_sample
+        )
+
+    def render_pending_sample(self):
+        """Render the latest navigation target."""
+        self.pending_render = None
+        if self.image_ids:
+            self.display_sample(min(self.current_index, len(self.image_ids) - 1))
+
+    def cancel_pending_render(self):
+        """Cancel the scheduled render, e.g. because the display is redrawn now."""
+        if self.pending_render is not None:
+            self.after_cancel(self.pending_render)
+            self.pending_render = None
+
+    @traced("navigate")
+    def step_sample(self, step, wrap=True):
+        """Move by step images, wrapping around or stopping at the ends."""
+        if not self.image_ids:
+            return
+        index = self.current_index + step
+        if wrap:
+            index %= len(self.image_ids)
+        else:
+            index = min(max(index, 0), len(self.image_ids) - 1)
+        self.request_display(index)
+
+    def go_to_sample(self, index):
+        """Move to the image at index."""
+        if self.image_ids:
+            self.request_display(index)
+
+    def next_sample(self):
+        """Display the next image in the dataset."""
+        self.step_sample(1)
 
     def prev_sample(self):
         """Display the previous image in the dataset."""
-        if not self.image_ids:
+        self.step_sample(-1)
+
+    def jump_to_image(self):
+        """Jump to the position, image ID or file name entered in the jump box."""
+        query = self.jump_entry.get()
+        if not self.image_ids or not query.strip():
             return
-        self.current_index = (self.current_index - 1) % len(self.image_ids)
-        self.display_sample(self.current_index)
+        if self.jump_index is None:
+            with tracer.span("jump_index_build"):
+                self.jump_index = JumpIndex(self.coco.loadImgs(self.image_ids))
+
+        position = self.jump_index.find(query)
+        if position is None:
+            messagebox.showerror("Error", f"No image matches '{query.strip()}'.")
+            return
+        self.focus_set()
+        self.go_to_sample(position)
 
     def add_dataset(self):
         """Add another dataset to merge with the current one."""
+        if not self.require_in_memory_dataset():
+            return
+
         # Get recent annotation file and image folder
         recent_annotation_file = self.recent_paths.get("annotation_file", "")
         recent_image_folder = self.recent_paths.get("image_folder", "")
@@ -553,7 +1286,7 @@ class CocoDatasetGUI(ctk.CTk):
         # Create popup window
         self.compare_window = ctk.CTkToplevel(self)
         self.compare_window.title("Compare Categories")
-        self.compare_window.geometry("600x400")
+        self.compare_window.geometry("800x500")
 
         # Create a main frame
         main_frame = ctk.CTkFrame(self.compare_window)
@@ -579,10 +1312,12 @@ class CocoDatasetGUI(ctk.CTk):
         existing_cats = self.coco.loadCats(self.coco.getCatIds())
         new_cats = new_coco.loadCats(new_coco.getCatIds())
 
-        existing_cat_ids = set(cat["id"] for cat in existing_cats)
-        new_cat_ids = set(cat["id"] for cat in new_cats)
-
-        categories_match = existing_cat_ids == new_cat_ids
+        # Match categories by name, supercategory and the remembered alias table
+        aliases = self.load_category_aliases()
+        matches = match_categories(existing_cats, new_cats, aliases)
+        categories_match = all(
+            target_id == cat["id"] for cat, (target_id, _) in zip(new_cats, matches)
+        ) and len(existing_cats) == len(new_cats)
 
         # Display message based on category match
         self.display_category_comparison_message(frame, categories_match)
@@ -590,6 +1325,16 @@ class CocoDatasetGUI(ctk.CTk):
         # Display categories side by side
         self.display_categories_side_by_side(frame, existing_cats, new_cats)
 
+        # Display one decision per source category with a preview of kept annotations
+        self.display_category_decisions(
+            frame,
+            max(len(existing_cats), len(new_cats)) + 2,
+            existing_cats,
+            new_cats,
+            new_coco,
+            matches,
+        )
+
         # Add merge and cancel buttons
         self.add_merge_cancel_buttons(frame, new_coco, new_image_folder)
 
@@ -612,7 +1357,7 @@ class CocoDatasetGUI(ctk.CTk):
         else:
             message_label = ctk.CTkLabel(
                 frame,
-                text="Warning: Categories do not match! Annotations may be lost.",
+                text="Warning: Categories do not match! Review the decisions below.",
                 fg_color="red",
                 text_color="white",
                 corner_radius=5,
@@ -648,12 +1393,139 @@ class CocoDatasetGUI(ctk.CTk):
                 label = ctk.CTkLabel(frame, text=f"{cat_name} ({cat_id})")
                 label.grid(row=i + 2, column=1, padx=5, pady=2, sticky="w")
 
+    def display_category_decisions(
+        self, frame, start_row, existing_cats, new_cats, new_coco, matches
+    ):
+        """Display a decision menu per source category and the merge preview."""
+        header_label = ctk.CTkLabel(frame, text="Merge Decisions")
+        header_label.grid(row=start_row, column=0, padx=5, pady=(15, 5), sticky="w")
+
+        # Menu entries mapped to decisions
+        self.category_decision_options = {
+            f"Map to {cat['name']} ({cat['id']})": cat["id"] for cat in existing_cats
+        }
+        self.category_decision_options["Add as new category"] = ADD_AS_NEW
+        self.category_decision_options["Drop annotations"] = DROP
+        self.decision_option_names = {
+            decision: text for text, decision in self.category_decision_options.items()
+        }
+
+        self.merge_source_cats = new_cats
+        self.merge_existing_cats = existing_cats
+        self.merge_source_counts = count_annotations_per_category(
+            new_coco.dataset.get("annotations", [])
+        )
+        self.category_decision_menus = []
+        self.category_preview_labels = []
+        for i, (cat, (_, reason)) in enumerate(zip(new_cats, matches)):
+            row = start_row + 1 + i
+            match_text = f", matched by {reason}" if reason else ""
+            label = ctk.CTkLabel(frame, text=f"{cat['name']} ({cat['id']}{match_text})")
+            label.grid(row=row, column=0, padx=5, pady=2, sticky="w")
+
+            menu = ctk.CTkOptionMenu(
+                frame,
+                values=list(self.category_decision_options),
+                command=self.update_merge_preview,
+            )
+            menu.grid(row=row, column=1, padx=5, pady=2, sticky="w")
+            self.category_decision_menus.append(menu)
+
+            preview_label = ctk.CTkLabel(frame, text="")
+            preview_label.grid(row=row, column=2, padx=5, pady=2, sticky="w")
+            self.category_preview_labels.append(preview_label)
+        row = start_row + 1 + len(new_cats)
+
+        self.merge_summary_label = ctk.CTkLabel(frame, text="")
+        self.merge_summary_label.grid(
+            row=row, column=0, columnspan=2, padx=5, pady=5, sticky="w"
+        )
+
+        alias_button = ctk.CTkButton(
+            frame, text="Load Alias Table", command=self.apply_category_aliases
+        )
+        alias_button.grid(row=row, column=2, padx=5, pady=5)
+
+        self.set_category_decisions(default_decisions(matches))
+
+    def set_category_decisions(self, decisions):
+        """Select the given decisions in the menus and refresh the preview."""
+        for menu, decision in zip(self.category_decision_menus, decisions):
+            menu.set(self.decision_option_names[decision])
+        self.update_merge_preview()
+
+    def get_category_decisions(self):
+        """Return the decisions selected in the menus."""
+        return [
+            self.category_decision_options[menu.get()]
+            for menu in self.category_decision_menus
+        ]
+
+    def update_merge_preview(self, *_):
+        """Show how many source annotations each decision keeps or drops."""
+        kept = 0
+        dropped = 0
+        for cat, decision, label in zip(
+            self.merge_source_cats,
+            self.get_category_decisions(),
+            self.category_preview_labels,
+        ):
+            count = self.merge_source_counts.get(cat["id"], 0)
+            if decision == DROP:
+                dropped += count
+                label.configure(text=f"drops {count}", text_color="red")
+            else:
+                kept += count
+                label.configure(text=f"keeps {count}", text_color="green")
+
+        # Annotations with categories missing from the category list are always lost
+        total = sum(self.merge_source_counts.values())
+        unknown = total - kept - dropped
+        summary = f"Keeps {kept} of {total} annotations, drops {dropped + unknown}"
+        if unknown:
+            summary += f" ({unknown} with unknown categories)"
+        self.merge_summary_label.configure(text=summary)
+
+    def load_category_aliases(self):
+        """Load the last used alias table, returning None if there is none."""
+        alias_file = self.recent_paths.get("category_aliases")
+        if not alias_file:
+            return None
+        try:
+            return load_alias_table(alias_file)
+        except (OSError, ValueError) as e:
+            print(f"Failed to load category aliases: {e}")
+            return None
+
+    def apply_category_aliases(self):
+        """Select an alias table and recompute the category matches with it."""
+        alias_file = filedialog.askopenfilename(
+            title="Select Category Alias Table",
+            filetypes=[("JSON Files", "*.json")],
+        )
+        if not alias_file:
+            return
+
+        try:
+            aliases = load_alias_table(alias_file)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to load alias table: {e}")
+            return
+
+        self.recent_paths["category_aliases"] = alias_file
+        self.save_recent_paths()
+
+        matches = match_categories(
+            self.merge_existing_cats, self.merge_source_cats, aliases
+        )
+        self.set_category_decisions(default_decisions(matches))
+
     def add_merge_cancel_buttons(self, frame, new_coco, new_image_folder):
         """Add merge and cancel buttons to the comparison window."""
         # Add a button frame at the bottom
         button_frame = ctk.CTkFrame(frame)
         button_frame.grid(
-            row=1000, column=0, columnspan=2, pady=10
+            row=10000, column=0, columnspan=3, pady=10
         )  # Adjusted row number
 
         # Merge button
@@ -673,7 +1545,7 @@ class CocoDatasetGUI(ctk.CTk):
     def confirm_merge(self, new_coco, new_image_folder):
         """Confirm and perform the merge of datasets."""
         # Proceed to merge datasets
-        self.merge_datasets(new_coco, new_image_folder)
+        self.merge_datasets(new_coco, new_image_folder, self.get_category_decisions())
 
         # Close the compare window
         self.compare_window.destroy()
@@ -686,16 +1558,28 @@ class CocoDatasetGUI(ctk.CTk):
         # Display the current image
         self.display_sample(self.current_index)
 
-    def merge_datasets(self, new_coco, new_image_folder):
-        """Merge the new dataset into the current dataset."""
-        existing_cat_ids = set(self.coco.getCatIds())
+    @traced("merge")
+    def merge_datasets(self, new_coco, new_image_folder, decisions=None):
+        """Merge the new dataset into the current dataset.
 
-        # Filter new annotations
-        new_ann_ids = new_coco.getAnnIds()
-        new_annotations = new_coco.loadAnns(new_ann_ids)
-        filtered_annotations = [
-            ann for ann in new_annotations if ann["category_id"] in existing_cat_ids
-        ]
+        Source categories are translated according to the decisions, by default
+        matching categories by name and adding unmatched ones as new categories.
+        """
+        existing_cats = self.coco.loadCats(self.coco.getCatIds())
+        new_cats = new_coco.loadCats(new_coco.getCatIds())
+        if decisions is None:
+            decisions = default_decisions(
+                match_categories(existing_cats, new_cats, self.load_category_aliases())
+            )
+        new_categories, table = build_translation_table(
+            existing_cats, new_cats, decisions
+        )
+
+        # Translate all category IDs at once, dropping unmapped annotations
+        new_annotations = new_coco.loadAnns(new_coco.getAnnIds())
+        category_ids = remap_ids([ann["category_id"] for ann in new_annotations], table)
+        keep = np.flatnonzero(category_ids >= 0)
+        filtered_annotations = [new_annotations[i] for i in keep]
 
         # Get image IDs for the filtered annotations
         image_ids_with_valid_annotations = set(
@@ -706,18 +1590,22 @@ class CocoDatasetGUI(ctk.CTk):
         new_images = new_coco.loadImgs(list(image_ids_with_valid_annotations))
 
         # Shift new image IDs and update image paths
-        self.shift_image_ids_and_paths(new_images, new_image_folder)
+        image_id_offset = self.shift_image_ids_and_paths(new_images, new_image_folder)
 
-        # Update annotations with new image IDs and shift annotation IDs
-        self.update_annotations_with_new_ids(filtered_annotations)
+        # Update annotations with new image, annotation and category IDs
+        self.update_annotations_with_new_ids(
+            filtered_annotations, image_id_offset, category_ids[keep]
+        )
 
-        # Merge annotations and images
+        # Merge categories, annotations and images
+        self.coco.dataset["categories"].extend(new_categories)
         self.coco.dataset["annotations"].extend(filtered_annotations)
         self.coco.dataset["images"].extend(new_images)
         self.image_ids.extend([img["id"] for img in new_images])
+        self.jump_index = None
 
         # Rebuild the index
-        self.coco.createIndex()
+        self.rebuild_index()
 
         # Update class colors and class list
         self.assign_class_colors()
@@ -726,27 +1614,32 @@ class CocoDatasetGUI(ctk.CTk):
         ]
 
     def shift_image_ids_and_paths(self, new_images, new_image_folder):
-        """Shift image IDs to avoid conflicts and update image paths."""
+        """Shift image IDs to avoid conflicts and update image paths.
+
+        Returns the offset added to the image IDs.
+        """
         existing_image_ids = self.coco.getImgIds()
         max_existing_image_id = max(existing_image_ids) if existing_image_ids else 0
+        image_id_offset = max_existing_image_id + 1
 
-        image_id_mapping = {}
+        new_image_index = ImagePathIndex(new_image_folder).load()
         for img in new_images:
-            old_id = img["id"]
-            new_id = old_id + max_existing_image_id + 1
-            img["id"] = new_id
-            image_id_mapping[old_id] = new_id
-            image_path = os.path.join(new_image_folder, img["file_name"])
-            self.image_id_to_path[new_id] = image_path
-
-    def update_annotations_with_new_ids(self, filtered_annotations):
-        """Update annotations with new image IDs and shift annotation IDs."""
+            img["id"] += image_id_offset
+            image_path, _ = new_image_index.resolve(img["file_name"])
+            self.image_id_to_path[img["id"]] = image_path
+        return image_id_offset
+
+    def update_annotations_with_new_ids(
+        self, filtered_annotations, image_id_offset, category_ids
+    ):
+        """Shift image and annotation IDs and set the translated category IDs."""
         existing_ann_ids = self.coco.getAnnIds()
         max_existing_ann_id = max(existing_ann_ids) if existing_ann_ids else 0
 
-        for ann in filtered_annotations:
-            ann["image_id"] += max_existing_ann_id + 1
+        for ann, category_id in zip(filtered_annotations, category_ids.tolist()):
+            ann["image_id"] += image_id_offset
             ann["id"] += max_existing_ann_id + 1
+            ann["category_id"] = category_id
 
     def sub_or_over_sample_dataset(self):
         # Open a new window for subsampling/oversampling options
@@ -800,11 +1693,15 @@ class CocoDatasetGUI(ctk.CTk):
 
     def add_missing_segmentation_field(self):
         """Add missing 'segmentation' field to annotations."""
+        if not self.require_in_memory_dataset():
+            return
+
         counter = 0
         for annotation in self.coco.dataset.get("annotations", []):
             if "segmentation" not in annotation:
                 annotation["segmentation"] = []
                 counter += 1
+        self.mask_cache.invalidate()
 
         messagebox.showinfo(
             "Success",
@@ -813,6 +1710,9 @@ class CocoDatasetGUI(ctk.CTk):
 
     def add_missing_is_crowd_field(self):
         """Add missing 'iscrowd' field to annotations."""
+        if not self.require_in_memory_dataset():
+            return
+
         counter = 0
         for annotation in self.coco.dataset.get("annotations", []):
             if "iscrowd" not in annotation:
@@ -824,10 +1724,349 @@ class CocoDatasetGUI(ctk.CTk):
             f"{counter} Missing 'iscrowd' fields have been added with default value 0.",
         )
 
-        self.coco.createIndex()
+        self.rebuild_index()
+
+    def recompute_geometry(self):
+        """Recompute 'area' and 'bbox' of all annotations from their segmentation."""
+        if not self.require_in_memory_dataset():
+            return
+
+        result = messagebox.askyesno(
+            "Confirm Recompute",
+            "Recompute 'area' and 'bbox' of all annotations from their segmentation?",
+        )
+        if not result:
+            return
+
+        try:
+            with tracer.span("recompute_geometry"):
+                report = recompute_geometry(self.coco.dataset)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to recompute geometry: {e}")
+            return
+
+        # Rebuild the index
+        self.rebuild_index()
+
+        messagebox.showinfo(
+            "Success",
+            f"Checked {report['num_with_segmentation']} annotations with segmentation "
+            f"({report['num_skipped']} skipped).\n"
+            f"Changed area: {report['num_area_changed']}\n"
+            f"Changed bbox: {report['num_bbox_changed']}",
+        )
+
+        # Optionally save the diff report
+        if report["changes"]:
+            report_file = filedialog.asksaveasfilename(
+                title="Save Geometry Diff Report (optional)",
+                defaultextension=".json",
+                initialfile="geometry_diff_report.json",
+                filetypes=[("JSON Files", "*.json")],
+            )
+            if report_file:
+                try:
+                    with open(report_file, "w") as f:
+                        json.dump(report, f, indent=4)
+                except Exception as e:
+                    messagebox.showerror("Error", f"Failed to save report: {e}")
+
+        self.display_sample(self.current_index)
+
+    def diff_with_version(self):
+        """Open a window to compare the dataset with another version of it."""
+        if not self.require_in_memory_dataset():
+            return
+
+        self.diff_window = ctk.CTkToplevel(self)
+        self.diff_window.title("Diff With Version")
+        self.diff_window.geometry("500x200")
+
+        frame = ctk.CTkFrame(self.diff_window)
+        frame.pack(padx=20, pady=20, fill="both", expand=True)
+
+        # Menu for the join key
+        match_label = ctk.CTkLabel(frame, text="Match annotations by:")
+        match_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        self.diff_match_menu = ctk.CTkOptionMenu(
+            frame, values=["ID", "File Name + Geometry"]
+        )
+        self.diff_match_menu.grid(row=0, column=1, padx=10, pady=5)
+
+        # Entry for the IoU threshold
+        iou_label = ctk.CTkLabel(frame, text="Same object IoU threshold:")
+        iou_label.grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        self.diff_iou_entry = ctk.CTkEntry(frame)
+        self.diff_iou_entry.insert(0, str(DIFF_IOU_THRESHOLD))
+        self.diff_iou_entry.grid(row=1, column=1, padx=10, pady=5)
+
+        # Diff button
+        diff_button = ctk.CTkButton(
+            frame, text="Select Older Version", command=self.apply_diff
+        )
+        diff_button.grid(row=2, column=0, columnspan=2, padx=10, pady=10)
+
+    def apply_diff(self):
+        """Diff the dataset against an older annotation file and review the changes."""
+        try:
+            iou_threshold = float(self.diff_iou_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid IoU threshold entered.")
+            return
+        match_by = "id" if self.diff_match_menu.get() == "ID" else "key"
+
+        old_file = filedialog.askopenfilename(
+            title="Select Older Annotation File",
+            filetypes=[("JSON Files", "*.json")],
+        )
+        if not old_file:
+            messagebox.showinfo("Info", "No annotation file selected.")
+            return
+
+        try:
+            with tracer.span("diff"):
+                with tracer.span("diff.load"):
+                    with open(old_file, "r") as f:
+                        old = json.load(f)
+                report = diff_datasets(old, self.coco.dataset, match_by, iou_threshold)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to diff datasets: {e}")
+            return
+        self.diff_window.destroy()
+
+        # One review set per change status and notes per image
+        sets = {status: [] for status in ("all changes",) + DIFF_STATUSES}
+        notes = {}
+        for change in report["changes"]:
+            image_id = change["image_id"]
+            if image_id is None:
+                continue
+            sets["all changes"].append(image_id)
+            sets[change["status"]].append(image_id)
+            notes.setdefault(image_id, []).append(
+                f"{change['status']}: annotation "
+                f"{change.get('new_id', change.get('old_id'))}, category "
+                f"{change.get('old_category_id', '-')} -> "
+                f"{change.get('new_category_id', '-')}"
+            )
+        for status, image_ids in sets.items():
+            # Keep every image once, in the order of its first change
+            sets[status] = list(dict.fromkeys(image_ids))
+        self.set_review_results("Diff", sets, notes)
+
+        summary = "\n".join(
+            f"{name.replace('_', ' ')}: {count}"
+            for name, count in report["summary"].items()
+        )
+        messagebox.showinfo(
+            "Diff", f"Changes since {os.path.basename(old_file)}:\n{summary}"
+        )
+
+        # Optionally save the diff report
+        if report["changes"] or report["images_removed"]:
+            report_file = filedialog.asksaveasfilename(
+                title="Save Diff Report (optional)",
+                defaultextension=".json",
+                initialfile="diff_report.json",
+                filetypes=[("JSON Files", "*.json")],
+            )
+            if report_file:
+                try:
+                    with open(report_file, "w") as f:
+                        json.dump(report, f, indent=4)
+                except Exception as e:
+                    messagebox.showerror("Error", f"Failed to save report: {e}")
+
+    def find_duplicates(self):
+        """Open a window to configure the duplicate and overlap detection."""
+        if not self.require_in_memory_dataset():
+            return
+
+        self.duplicates_window = ctk.CTkToplevel(self)
+        self.duplicates_window.title("Find Duplicates")
+        self.duplicates_window.geometry("500x220")
+
+        frame = ctk.CTkFrame(self.duplicates_window)
+        frame.pack(padx=20, pady=20, fill="both", expand=True)
+
+        # Entries for the IoU thresholds
+        duplicate_label = ctk.CTkLabel(frame, text="Same-class duplicate IoU:")
+        duplicate_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        self.duplicate_iou_entry = ctk.CTkEntry(frame)
+        self.duplicate_iou_entry.insert(0, str(DUPLICATE_IOU_THRESHOLD))
+        self.duplicate_iou_entry.grid(row=0, column=1, padx=10, pady=5)
+
+        conflict_label = ctk.CTkLabel(frame, text="Cross-class conflict IoU:")
+        conflict_label.grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        self.conflict_iou_entry = ctk.CTkEntry(frame)
+        self.conflict_iou_entry.insert(0, str(CONFLICT_IOU_THRESHOLD))
+        self.conflict_iou_entry.grid(row=1, column=1, padx=10, pady=5)
+
+        # Menu for the action on duplicates
+        action_label = ctk.CTkLabel(frame, text="Same-class duplicates:")
+        action_label.grid(row=2, column=0, padx=10, pady=5, sticky="w")
+        self.duplicate_action_menu = ctk.CTkOptionMenu(
+            frame, values=["Flag for Review", "Remove"]
+        )
+        self.duplicate_action_menu.grid(row=2, column=1, padx=10, pady=5)
+
+        # Run button
+        run_button = ctk.CTkButton(
+            frame, text="Run", command=self.apply_find_duplicates
+        )
+        run_button.grid(row=3, column=0, columnspan=2, padx=10, pady=10)
+
+    def apply_find_duplicates(self):
+        """Detect overlapping boxes, optionally remove duplicates and review the hits."""
+        try:
+            duplicate_iou = float(self.duplicate_iou_entry.get())
+            conflict_iou = float(self.conflict_iou_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid IoU threshold entered.")
+            return
+        remove = self.duplicate_action_menu.get() == "Remove"
+
+        try:
+            with tracer.span("find_duplicates"):
+                report = find_overlaps(
+                    self.coco.dataset["annotations"], duplicate_iou, conflict_iou
+                )
+                if remove and report["redundant_rows"]:
+                    self.coco.dataset["annotations"] = drop_rows(
+                        self.coco.dataset["annotations"], report["redundant_rows"]
+                    )
+                    self.rebuild_index()
+                    self.mask_cache.invalidate()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to find duplicates: {e}")
+            return
+        self.duplicates_window.destroy()
+
+        # One review set per kind of hit and notes per image
+        sets = {"duplicates": [], "conflicts": []}
+        notes = {}
+        for kind in sets:
+            for pair in report[kind]:
+                sets[kind].append(pair["image_id"])
+                notes.setdefault(pair["image_id"], []).append(
+                    f"{kind[:-1]}: annotations {pair['ann_ids'][0]} and "
+                    f"{pair['ann_ids'][1]} (categories {pair['category_ids'][0]}, "
+                    f"{pair['category_ids'][1]}), IoU {pair['iou']:.2f}"
+                )
+            sets[kind] = list(dict.fromkeys(sets[kind]))
+        self.set_review_results("Duplicates", sets, notes)
+
+        action = "Removed" if remove else "Redundant"
+        messagebox.showinfo(
+            "Duplicates",
+            f"Same-class duplicate pairs: {len(report['duplicates'])}\n"
+            f"Cross-class conflict pairs: {len(report['conflicts'])}\n"
+            f"{action} duplicate annotations: {len(report['redundant_rows'])}",
+        )
+        self.update_info_textbox()
+
+    def split_dataset(self):
+        """Open a window to configure a stratified train/val/test split."""
+        if not self.require_in_memory_dataset():
+            return
+
+        self.split_window = ctk.CTkToplevel(self)
+        self.split_window.title("Split Dataset")
+        self.split_window.geometry("600x350")
+
+        frame = ctk.CTkFrame(self.split_window)
+        frame.pack(padx=20, pady=20, fill="both", expand=True)
+
+        # Entries for the split ratios
+        self.split_ratio_entries = {}
+        for row, (split_name, ratio) in enumerate(DEFAULT_SPLITS.items()):
+            label = ctk.CTkLabel(frame, text=f"Ratio '{split_name}':")
+            label.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+            entry = ctk.CTkEntry(frame)
+            entry.insert(0, str(ratio))
+            entry.grid(row=row, column=1, padx=10, pady=5)
+            self.split_ratio_entries[split_name] = entry
+        row = len(DEFAULT_SPLITS)
+
+        # Entry for the group pattern
+        group_label = ctk.CTkLabel(
+            frame, text="Group pattern (regex on file_name, optional):"
+        )
+        group_label.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        self.split_group_entry = ctk.CTkEntry(frame, placeholder_text=r"^(.*)_\d+")
+        self.split_group_entry.grid(row=row, column=1, padx=10, pady=5)
+
+        # Entry for the seed
+        seed_label = ctk.CTkLabel(frame, text="Seed:")
+        seed_label.grid(row=row + 1, column=0, padx=10, pady=5, sticky="w")
+        self.split_seed_entry = ctk.CTkEntry(frame)
+        self.split_seed_entry.insert(0, "42")
+        self.split_seed_entry.grid(row=row + 1, column=1, padx=10, pady=5)
+
+        # Split button
+        split_button = ctk.CTkButton(frame, text="Split", command=self.apply_split)
+        split_button.grid(row=row + 2, column=0, columnspan=2, padx=10, pady=10)
+
+    def apply_split(self):
+        """Compute the stratified split and write one annotation file per split."""
+        try:
+            ratios = {
+                split_name: float(entry.get() or 0)
+                for split_name, entry in self.split_ratio_entries.items()
+            }
+            seed = int(self.split_seed_entry.get() or 0)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid ratio or seed entered.")
+            return
+
+        # Only keep splits with a positive ratio
+        ratios = {name: ratio for name, ratio in ratios.items() if ratio > 0}
+        if not ratios:
+            messagebox.showerror("Error", "At least one ratio must be positive.")
+            return
+
+        output_dir = filedialog.askdirectory(title="Select Output Directory")
+        if not output_dir:
+            messagebox.showinfo("Info", "No output directory selected.")
+            return
+
+        base_name = (
+            os.path.splitext(os.path.basename(self.annotation_file))[0]
+            if self.annotation_file
+            else "annotations"
+        )
+
+        try:
+            with tracer.span("split"):
+                image_split = stratified_split(
+                    self.coco.dataset,
+                    list(ratios.values()),
+                    self.split_group_entry.get() or None,
+                    seed,
+                )
+                paths = write_splits(
+                    self.coco.dataset, image_split, list(ratios), output_dir, base_name
+                )
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to split dataset: {e}")
+            return
+
+        # Summarize the number of images per split
+        counts = [0] * len(ratios)
+        for split_index in image_split.values():
+            counts[split_index] += 1
+        summary = "\n".join(
+            f"{split_name}: {count} images -> {os.path.basename(path)}"
+            for split_name, count, path in zip(ratios, counts, paths)
+        )
+        messagebox.showinfo("Success", f"Dataset split written:\n{summary}")
+
+        self.split_window.destroy()
 
     def manage_classes(self):
         """Open a window to manage class IDs."""
+        if not self.require_in_memory_dataset():
+            return
 
         # Open a new window
         self.manage_window = ctk.CTkToplevel(self)
@@ -932,47 +2171,49 @@ class CocoDatasetGUI(ctk.CTk):
             if not result:
                 return
 
-        # Apply changes
-        # Update category IDs
-        for old_id, new_id in new_ids.items():
-            if old_id != new_id:
-                # Update category ID in categories
-                for cat in self.coco.dataset["categories"]:
-                    if cat["id"] == old_id:
-                        cat["id"] = new_id
-                        break
-                # Update category ID in annotations
-                for ann in self.coco.dataset["annotations"]:
-                    if ann["category_id"] == old_id:
-                        ann["category_id"] = new_id
-                # Update class colors
-                if old_id in self.class_colors:
-                    self.class_colors[new_id] = self.class_colors.pop(old_id)
-                existing_ids.discard(old_id)
-                existing_ids.add(new_id)
-
-        # Delete categories and associated annotations
-        if delete_category_ids:
-            # Remove categories
-            self.coco.dataset["categories"] = [
-                cat
-                for cat in self.coco.dataset["categories"]
-                if cat["id"] not in delete_category_ids
-            ]
-            # Remove annotations
-            self.coco.dataset["annotations"] = [
-                ann
-                for ann in self.coco.dataset["annotations"]
-                if ann["category_id"] not in delete_category_ids
-            ]
-            # Remove class colors
-            for del_id in delete_category_ids:
-                if del_id in self.class_colors:
-                    del self.class_colors[del_id]
-            existing_ids = existing_ids.difference(set(delete_category_ids))
-
-        # Rebuild the index
-        self.coco.createIndex()
+        with tracer.span("remap"):
+            # Apply changes
+            # Update category IDs
+            for old_id, new_id in new_ids.items():
+                if old_id != new_id:
+                    # Update category ID in categories
+                    for cat in self.coco.dataset["categories"]:
+                        if cat["id"] == old_id:
+                            cat["id"] = new_id
+                            break
+                    # Update category ID in annotations
+                    for ann in self.coco.dataset["annotations"]:
+                        if ann["category_id"] == old_id:
+                            ann["category_id"] = new_id
+                    # Update class colors
+                    if old_id in self.class_colors:
+                        self.class_colors[new_id] = self.class_colors.pop(old_id)
+                    existing_ids.discard(old_id)
+                    existing_ids.add(new_id)
+
+            # Delete categories and associated annotations
+            if delete_category_ids:
+                # Remove categories
+                self.coco.dataset["categories"] = [
+                    cat
+                    for cat in self.coco.dataset["categories"]
+                    if cat["id"] not in delete_category_ids
+                ]
+                # Remove annotations
+                self.coco.dataset["annotations"] = [
+                    ann
+                    for ann in self.coco.dataset["annotations"]
+                    if ann["category_id"] not in delete_category_ids
+                ]
+                # Remove class colors
+                for del_id in delete_category_ids:
+                    if del_id in self.class_colors:
+                        del self.class_colors[del_id]
+                existing_ids = existing_ids.difference(set(delete_category_ids))
+
+            # Rebuild the index
+            self.rebuild_index()
+            self.mask_cache.invalidate()
 
         self.assign_class_colors()
 
@@ -1003,8 +2244,8 @@ class CocoDatasetGUI(ctk.CTk):
             return
 
         try:
-            with open(output_file, "w") as f:
-                json.dump(self.coco.dataset, f)
+            with tracer.span("export.annotations"):
+                self.write_annotations(output_file)
             messagebox.showinfo("Success", f"Annotations saved to {output_file}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save annotations: {e}")
@@ -1025,26 +2266,276 @@ class CocoDatasetGUI(ctk.CTk):
         # Save annotations
         annotations_file = os.path.join(annotations_dir, "instances.json")
         try:
-            with open(annotations_file, "w") as f:
-                json.dump(self.coco.dataset, f)
+            with tracer.span("export.dataset.annotations"):
+                self.write_annotations(annotations_file)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save annotations: {e}")
             return
 
         # Copy images
         try:
-            for img_id in self.image_ids:
-                image_path = self.image_id_to_path[img_id]
-                img_filename = os.path.basename(image_path)
-                dest_path = os.path.join(images_dir, img_filename)
-                if not os.path.exists(dest_path):
-                    shutil.copy(image_path, dest_path)
+            with tracer.span("export.dataset.images"):
+                for file_name, image_path in self.iter_image_paths():
+                    # Keep subdirectories, images may share a name across folders
+                    dest_path = os.path.join(
+                        images_dir, output_relative_path(file_name)
+                    )
+                    if not os.path.exists(dest_path):
+                        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                        shutil.copy(image_path, dest_path)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to copy images: {e}")
             return
 
         messagebox.showinfo("Success", f"Dataset exported to {output_dir}")
 
+    def export_tar_shards(self):
+        """Open a window to configure the export as WebDataset-style tar shards."""
+        if not self.coco:
+            return
+
+        self.tar_window = ctk.CTkToplevel(self)
+        self.tar_window.title("Export Tar Shards")
+        self.tar_window.geometry("400x150")
+
+        frame = ctk.CTkFrame(self.tar_window)
+        frame.pack(padx=20, pady=20, fill="both", expand=True)
+
+        # Entry for the number of samples per shard
+        shard_size_label = ctk.CTkLabel(frame, text="Images per shard:")
+        shard_size_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        self.tar_shard_size_entry = ctk.CTkEntry(frame)
+        self.tar_shard_size_entry.insert(0, str(TAR_SHARD_SIZE))
+        self.tar_shard_size_entry.grid(row=0, column=1, padx=10, pady=5)
+
+        # Export button
+        export_button = ctk.CTkButton(
+            frame, text="Export", command=self.apply_tar_shard_export
+        )
+        export_button.grid(row=1, column=0, columnspan=2, padx=10, pady=10)
+
+    def apply_tar_shard_export(self):
+        """Write the images and their annotations to tar shards in parallel."""
+        try:
+            shard_size = int(self.tar_shard_size_entry.get())
+        except ValueError:
+            shard_size = 0
+        if shard_size <= 0:
+            messagebox.showerror("Error", "Images per shard must be a positive number.")
+            return
+
+        output_dir = filedialog.askdirectory(title="Select Output Directory")
+        if not output_dir:
+            messagebox.showinfo("Info", "No output directory selected.")
+            return
+
+        try:
+            with tracer.span("export.tar_shards"):
+                index_file, failed = export_tar_shards(
+                    self.coco, self.image_path_for, output_dir, shard_size
+                )
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export tar shards: {e}")
+            return
+
+        message = f"Tar shards exported to {output_dir}\nShard index: {index_file}"
+        if failed:
+            message += f"\n\n{len(failed)} images could not be read and were skipped:\n"
+            message += "\n".join(failed[:10])
+        messagebox.showinfo("Success", message)
+
+        self.tar_window.destroy()
+
+    def export_resized_dataset(self):
+        """Open a window to configure an export with resized and transcoded images."""
+        if not self.require_in_memory_dataset():
+            return
+
+        self.resize_window = ctk.CTkToplevel(self)
+        self.resize_window.title("Export Resized Dataset")
+        self.resize_window.geometry("500x250")
+
+        frame = ctk.CTkFrame(self.resize_window)
+        frame.pack(padx=20, pady=20, fill="both", expand=True)
+
+        # Entry for the maximum side length
+        max_side_label = ctk.CTkLabel(frame, text="Max side (px, empty to keep):")
+        max_side_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        self.resize_max_side_entry = ctk.CTkEntry(frame)
+        self.resize_max_side_entry.insert(0, "1280")
+        self.resize_max_side_entry.grid(row=0, column=1, padx=10, pady=5)
+
+        # Menu for the output format
+        format_label = ctk.CTkLabel(frame, text="Format:")
+        format_label.grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        self.resize_format_menu = ctk.CTkOptionMenu(frame, values=list(EXPORT_FORMATS))
+        self.resize_format_menu.set("JPEG")
+        self.resize_format_menu.grid(row=1, column=1, padx=10, pady=5)
+
+        # Entry for the encoder quality
+        quality_label = ctk.CTkLabel(frame, text="Quality (JPEG/WebP, 1-100):")
+        quality_label.grid(row=2, column=0, padx=10, pady=5, sticky="w")
+        self.resize_quality_entry = ctk.CTkEntry(frame)
+        self.resize_quality_entry.insert(0, "90")
+        self.resize_quality_entry.grid(row=2, column=1, padx=10, pady=5)
+
+        # Export button
+        export_button = ctk.CTkButton(
+            frame, text="Export", command=self.apply_resized_export
+        )
+        export_button.grid(row=3, column=0, columnspan=2, padx=10, pady=10)
+
+    def apply_resized_export(self):
+        """Resize and transcode all images in parallel and rescale the annotations."""
+        try:
+            max_side = int(self.resize_max_side_entry.get() or 0) or None
+            quality = int(self.resize_quality_entry.get() or 90)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid max side or quality entered.")
+            return
+        if not 1 <= quality <= 100:
+            messagebox.showerror("Error", "Quality must be between 1 and 100.")
+            return
+
+        output_dir = filedialog.askdirectory(title="Select Output Directory")
+        if not output_dir:
+            messagebox.showinfo("Info", "No output directory selected.")
+            return
+
+        try:
+            with tracer.span("export.resized"):
+                _, failed = export_resized_dataset(
+                    self.coco.dataset,
+                    self.image_id_to_path,
+                    output_dir,
+                    max_side=max_side,
+                    image_format=self.resize_format_menu.get(),
+                    quality=quality,
+                )
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export resized dataset: {e}")
+            return
+
+        message = f"Resized dataset exported to {output_dir}"
+        if failed:
+            message += f"\n\n{len(failed)} images failed and were skipped:\n"
+            message += "\n".join(
+                f"{file_name}: {error}" for file_name, error in failed[:10]
+            )
+        messagebox.showinfo("Success", message)
+
+        self.resize_window.destroy()
+
+    def export_crops(self):
+        """Open a window to configure the export of object crops."""
+        if not self.coco:
+            return
+
+        self.crops_window = ctk.CTkToplevel(self)
+        self.crops_window.title("Export Object Crops")
+        self.crops_window.geometry("550x400")
+
+        frame = ctk.CTkFrame(self.crops_window)
+        frame.pack(padx=20, pady=20, fill="both", expand=True)
+
+        # Entries for the crop options, with their default values
+        self.crop_entries = {}
+        for row, (name, text, default) in enumerate(
+            [
+                ("padding", "Padding (fraction of box size):", "0.1"),
+                ("output_size", "Output size (px, empty to keep):", "224"),
+                ("min_size", "Minimum box side (px):", "8"),
+                ("categories", "Categories (names or IDs, empty for all):", ""),
+            ]
+        ):
+            label = ctk.CTkLabel(frame, text=text)
+            label.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+            entry = ctk.CTkEntry(frame)
+            entry.insert(0, default)
+            entry.grid(row=row, column=1, padx=10, pady=5)
+            self.crop_entries[name] = entry
+
+        # Menus for the crop shape and the output layout
+        shape_label = ctk.CTkLabel(frame, text="Shape:")
+        shape_label.grid(row=4, column=0, padx=10, pady=5, sticky="w")
+        self.crop_shape_menu = ctk.CTkOptionMenu(frame, values=list(CROP_SHAPES))
+        self.crop_shape_menu.set("square")
+        self.crop_shape_menu.grid(row=4, column=1, padx=10, pady=5)
+
+        layout_label = ctk.CTkLabel(frame, text="Output:")
+        layout_label.grid(row=5, column=0, padx=10, pady=5, sticky="w")
+        self.crop_layout_menu = ctk.CTkOptionMenu(
+            frame, values=["Category Folders", "Tar Shards"]
+        )
+        self.crop_layout_menu.grid(row=5, column=1, padx=10, pady=5)
+
+        # Export button
+        export_button = ctk.CTkButton(
+            frame, text="Export", command=self.apply_crop_export
+        )
+        export_button.grid(row=6, column=0, columnspan=2, padx=10, pady=10)
+
+    def apply_crop_export(self):
+        """Crop every selected annotation box in parallel."""
+        try:
+            padding = float(self.crop_entries["padding"].get() or 0)
+            output_size = int(self.crop_entries["output_size"].get() or 0) or None
+            min_size = float(self.crop_entries["min_size"].get() or 0)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid padding, output size or min size.")
+            return
+
+        # Resolve the category filter from names or IDs
+        cat_ids = None
+        category_filter = self.crop_entries["categories"].get().strip()
+        if category_filter:
+            cats = self.coco.loadCats(self.coco.getCatIds())
+            cat_ids = []
+            for value in category_filter.split(","):
+                value = value.strip()
+                matching = [
+                    cat["id"]
+                    for cat in cats
+                    if cat["name"] == value or str(cat["id"]) == value
+                ]
+                if not matching:
+                    messagebox.showerror("Error", f"Unknown category '{value}'.")
+                    return
+                cat_ids.extend(matching)
+
+        output_dir = filedialog.askdirectory(title="Select Output Directory")
+        if not output_dir:
+            messagebox.showinfo("Info", "No output directory selected.")
+            return
+
+        try:
+            with tracer.span("export.crops"):
+                counts, failed = export_crops(
+                    self.coco,
+                    self.image_path_for,
+                    output_dir,
+                    padding=padding,
+                    shape=self.crop_shape_menu.get(),
+                    output_size=output_size,
+                    min_size=min_size,
+                    cat_ids=cat_ids,
+                    as_tar_shards=self.crop_layout_menu.get() == "Tar Shards",
+                )
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export crops: {e}")
+            return
+
+        message = (
+            f"{sum(counts.values())} crops of {len(counts)} categories "
+            f"exported to {output_dir}"
+        )
+        if failed:
+            message += f"\n\n{len(failed)} images or crops failed and were skipped:\n"
+            message += "\n".join(failed[:10])
+        messagebox.showinfo("Success", message)
+
+        self.crops_window.destroy()
+
 
 if __name__ == "__main__":
     app = CocoDatasetGUI()
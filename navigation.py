@@ -0,0 +1,41 @@
+import os
+
+# Prefix of jump queries addressing an image by its ID
+IMAGE_ID_PREFIX = "id:"
+
+
+class JumpIndex:
+    """Lookup from image IDs and file names to positions in the navigation order.
+
+    Built once per navigation order, so every jump is a dictionary lookup. Jump
+    queries are a 1-based position ('700000' or '#700000'), an image ID prefixed
+    with 'id:' or a file name, matched by relative path first, then by base name.
+    """
+
+    def __init__(self, images):
+        self.num_images = len(images)
+        self.positions_by_id = {}
+        self.positions_by_name = {}
+        self.positions_by_basename = {}
+        for position, img in enumerate(images):
+            self.positions_by_id[str(img["id"])] = position
+            file_name = img.get("file_name", "").replace("\\", "/")
+            self.positions_by_name.setdefault(file_name, position)
+            self.positions_by_basename.setdefault(os.path.basename(file_name), position)
+
+    def find(self, query):
+        """Return the position matching a jump query, or None."""
+        query = query.strip()
+        if query.startswith(IMAGE_ID_PREFIX):
+            return self.positions_by_id.get(query[len(IMAGE_ID_PREFIX) :].strip())
+
+        number = query[1:] if query.startswith("#") else query
+        if number.isdigit():
+            position = int(number) - 1
+            return position if 0 <= position < self.num_images else None
+
+        file_name = query.replace("\\", "/")
+        position = self.positions_by_name.get(file_name)
+        if position is None:
+            position = self.positions_by_basename.get(os.path.basename(file_name))
+        return position
@@ -0,0 +1,587 @@
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from category_matching import (
+    build_translation_table,
+    default_decisions,
+    load_alias_table,
+    match_categories,
+    remap_ids,
+)
+from duplicates import DUPLICATE_IOU_THRESHOLD, remove_duplicates
+from segmentation import (
+    compute_geometry_chunk,
+    segmented_annotations,
+    update_geometry,
+)
+from splitting import stratified_split, write_splits
+from sqlite_dataset import iter_json_sections
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Number of annotations passed through the fused steps at once
+PIPELINE_CHUNK_SIZE = 10000
+
+
+class Step:
+    """Base class of pipeline steps.
+
+    Steps transform the categories, images and annotations sections. Annotations
+    are passed in chunks, so consecutive steps are fused into one streaming pass
+    over the annotations. Steps that need the whole dataset set 'barrier' and
+    implement dataset(); the dataset is only materialized in memory for them.
+    """
+
+    # Sections that must be processed before annotations can be streamed
+    needs = ()
+
+    # True if the step needs the whole dataset in memory
+    barrier = False
+
+    def __init__(self, base_dir=".", **params):
+        self.base_dir = base_dir
+        self.params = params
+        self.stats = {}
+
+    def path(self, path):
+        """Resolve a path relative to the pipeline file."""
+        return os.path.join(self.base_dir, os.path.expanduser(path))
+
+    def count(self, name, value=1):
+        self.stats[name] = self.stats.get(name, 0) + value
+
+    def categories(self, categories):
+        return categories
+
+    def images(self, images):
+        return images
+
+    def annotations(self, anns):
+        return anns
+
+    def dataset(self, dataset):
+        return dataset
+
+
+class AddMissingIsCrowd(Step):
+    """Add 'iscrowd': 0 to annotations without it."""
+
+    def annotations(self, anns):
+        for ann in anns:
+            if "iscrowd" not in ann:
+                ann["iscrowd"] = 0
+                self.count("added")
+        return anns
+
+
+class AddMissingSegmentation(Step):
+    """Add an empty 'segmentation' list to annotations without it."""
+
+    def annotations(self, anns):
+        for ann in anns:
+            if "segmentation" not in ann:
+                ann["segmentation"] = []
+                self.count("added")
+        return anns
+
+
+class RemapCategories(Step):
+    """Change category IDs with a {old ID: new ID} mapping, null drops a category."""
+
+    def __init__(self, base_dir=".", mapping=None, **params):
+        super().__init__(base_dir, **params)
+        self.mapping = {
+            int(old_id): -1 if new_id is None else int(new_id)
+            for old_id, new_id in (mapping or {}).items()
+        }
+        source_ids = np.array(sorted(self.mapping), dtype=np.int64)
+        target_ids = np.array(
+            [self.mapping[old_id] for old_id in source_ids], dtype=np.int64
+        )
+        self.table = (source_ids, target_ids)
+
+    def categories(self, categories):
+        # Categories remapped onto an existing ID are merged into that category
+        kept_ids = {cat["id"] for cat in categories if cat["id"] not in self.mapping}
+        remapped = []
+        for cat in categories:
+            if cat["id"] not in self.mapping:
+                remapped.append(cat)
+                continue
+            new_id = self.mapping[cat["id"]]
+            if new_id >= 0 and new_id not in kept_ids:
+                kept_ids.add(new_id)
+                remapped.append(dict(cat, id=new_id))
+        return remapped
+
+    def annotations(self, anns):
+        category_ids = np.fromiter(
+            (ann["category_id"] for ann in anns), dtype=np.int64, count=len(anns)
+        )
+        mapped = np.isin(category_ids, self.table[0])
+        new_ids = np.where(mapped, remap_ids(category_ids, self.table), category_ids)
+
+        kept = []
+        for ann, new_id, changed in zip(anns, new_ids.tolist(), mapped.tolist()):
+            if new_id < 0:
+                self.count("dropped")
+                continue
+            if changed:
+                ann["category_id"] = new_id
+                self.count("remapped")
+            kept.append(ann)
+        return kept
+
+
+class RenameCategories(Step):
+    """Rename categories with a {category ID: new name} mapping."""
+
+    def categories(self, categories):
+        names = {int(cat_id): name for cat_id, name in self.params["names"].items()}
+        for cat in categories:
+            if cat["id"] in names:
+                cat["name"] = names[cat["id"]]
+                self.count("renamed")
+        return categories
+
+
+class DropCategories(Step):
+    """Remove categories given by 'ids' or 'names' with all their annotations."""
+
+    def __init__(self, base_dir=".", **params):
+        super().__init__(base_dir, **params)
+        self.drop_ids = set(params.get("ids", []))
+        self.names = set(params.get("names", []))
+        if self.names:
+            self.needs = ("categories",)
+
+    def categories(self, categories):
+        self.drop_ids |= {cat["id"] for cat in categories if cat["name"] in self.names}
+        return [cat for cat in categories if cat["id"] not in self.drop_ids]
+
+    def annotations(self, anns):
+        kept = [ann for ann in anns if ann["category_id"] not in self.drop_ids]
+        self.count("dropped", len(anns) - len(kept))
+        return kept
+
+
+class FilterAnnotations(Step):
+    """Remove annotations outside 'min_area'/'max_area' or crowd annotations."""
+
+    def annotations(self, anns):
+        min_area = self.params.get("min_area")
+        max_area = self.params.get("max_area")
+        drop_crowd = self.params.get("drop_crowd", False)
+        kept = [
+            ann
+            for ann in anns
+            if (min_area is None or ann.get("area", 0) >= min_area)
+            and (max_area is None or ann.get("area", 0) <= max_area)
+            and not (drop_crowd and ann.get("iscrowd", 0))
+        ]
+        self.count("dropped", len(anns) - len(kept))
+        return kept
+
+
+class DeleteImages(Step):
+    """Remove images given by 'ids' or a 'file_name_pattern' with their annotations."""
+
+    def __init__(self, base_dir=".", **params):
+        super().__init__(base_dir, **params)
+        self.delete_ids = set(params.get("ids", []))
+        self.pattern = params.get("file_name_pattern")
+        if self.pattern:
+            self.pattern = re.compile(self.pattern)
+            self.needs = ("images",)
+
+    def images(self, images):
+        if self.pattern:
+            self.delete_ids |= {
+                img["id"] for img in images if self.pattern.search(img["file_name"])
+            }
+        kept = [img for img in images if img["id"] not in self.delete_ids]
+        self.count("deleted_images", len(images) - len(kept))
+        return kept
+
+    def annotations(self, anns):
+        kept = [ann for ann in anns if ann["image_id"] not in self.delete_ids]
+        self.count("deleted_annotations", len(anns) - len(kept))
+        return kept
+
+
+class RecomputeGeometry(Step):
+    """Recompute 'area' and 'bbox' from the segmentation of each annotation."""
+
+    needs = ("images",)
+
+    def __init__(self, base_dir=".", **params):
+        super().__init__(base_dir, **params)
+        self.image_sizes = {}
+
+    def images(self, images):
+        self.image_sizes = {
+            img["id"]: (img.get("height"), img.get("width")) for img in images
+        }
+        return images
+
+    def annotations(self, anns):
+        with_segmentation = segmented_annotations(anns)
+        if not with_segmentation:
+            return anns
+
+        new_areas, new_bboxes = compute_geometry_chunk(
+            [
+                (ann["segmentation"],)
+                + self.image_sizes.get(ann["image_id"], (None, None))
+                for ann in with_segmentation
+            ]
+        )
+        report = update_geometry(with_segmentation, new_areas, new_bboxes)
+        self.count("area_changed", report["num_area_changed"])
+        self.count("bbox_changed", report["num_bbox_changed"])
+        return anns
+
+
+class Merge(Step):
+    """Merge another annotation file, matching categories by name and aliases."""
+
+    barrier = True
+
+    def dataset(self, dataset):
+        with open(self.path(self.params["annotation_file"]), "r") as f:
+            source = json.load(f)
+        aliases = None
+        if self.params.get("aliases"):
+            aliases = load_alias_table(self.path(self.params["aliases"]))
+
+        target_cats = dataset.setdefault("categories", [])
+        source_cats = source.get("categories", [])
+        decisions = default_decisions(
+            match_categories(target_cats, source_cats, aliases)
+        )
+        new_categories, table = build_translation_table(
+            target_cats, source_cats, decisions
+        )
+
+        source_anns = source.get("annotations", [])
+        category_ids = remap_ids([ann["category_id"] for ann in source_anns], table)
+        image_id_offset = (
+            max((img["id"] for img in dataset.get("images", [])), default=0) + 1
+        )
+        ann_id_offset = (
+            max((ann["id"] for ann in dataset.get("annotations", [])), default=0) + 1
+        )
+
+        # Like the GUI merge, only images with kept annotations are added
+        kept_image_ids = set()
+        for ann, category_id in zip(source_anns, category_ids.tolist()):
+            if category_id < 0:
+                self.count("dropped_annotations")
+                continue
+            kept_image_ids.add(ann["image_id"])
+            ann["category_id"] = category_id
+            ann["image_id"] += image_id_offset
+            ann["id"] += ann_id_offset
+            dataset.setdefault("annotations", []).append(ann)
+            self.count("added_annotations")
+        for img in source.get("images", []):
+            if img["id"] in kept_image_ids:
+                img["id"] += image_id_offset
+                dataset.setdefault("images", []).append(img)
+                self.count("added_images")
+        target_cats.extend(new_categories)
+        self.count("added_categories", len(new_categories))
+        return dataset
+
+
+class RemoveDuplicates(Step):
+    """Remove same-category boxes of an image overlapping with IoU >= 'iou'."""
+
+    barrier = True
+
+    def dataset(self, dataset):
+        report = remove_duplicates(
+            dataset, self.params.get("iou", DUPLICATE_IOU_THRESHOLD)
+        )
+        self.count("removed", len(report["redundant_rows"]))
+        return dataset
+
+
+class Split(Step):
+    """Write a stratified split of the current dataset to 'output_dir'."""
+
+    barrier = True
+
+    def dataset(self, dataset):
+        ratios = self.params.get("ratios", {"train": 0.8, "val": 0.1, "test": 0.1})
+        image_split = stratified_split(
+            dataset,
+            list(ratios.values()),
+            self.params.get("group_pattern"),
+            self.params.get("seed", 42),
+        )
+        output_dir = self.path(self.params["output_dir"])
+        os.makedirs(output_dir, exist_ok=True)
+        paths = write_splits(
+            dataset,
+            image_split,
+            list(ratios),
+            output_dir,
+            self.params.get("base_name", "annotations"),
+        )
+        self.count("files_written", len(paths))
+        return dataset
+
+
+# Pipeline operations by the name used in pipeline files
+OPERATIONS = {
+    "add_missing_iscrowd": AddMissingIsCrowd,
+    "add_missing_segmentation": AddMissingSegmentation,
+    "remap_categories": RemapCategories,
+    "rename_categories": RenameCategories,
+    "drop_categories": DropCategories,
+    "filter_annotations": FilterAnnotations,
+    "delete_images": DeleteImages,
+    "recompute_geometry": RecomputeGeometry,
+    "merge": Merge,
+    "remove_duplicates": RemoveDuplicates,
+    "split": Split,
+}
+
+
+class JsonSink:
+    """Writes sections to a COCO JSON file as they are produced."""
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path + ".tmp", "w")
+        self.f.write("{")
+        self.first_section = True
+        self.first_item = True
+
+    def begin_array(self, key):
+        self.f.write(("" if self.first_section else ", ") + json.dumps(key) + ": [")
+        self.first_section = False
+        self.first_item = True
+
+    def write_items(self, items):
+        for item in items:
+            self.f.write(("" if self.first_item else ", ") + json.dumps(item))
+            self.first_item = False
+
+    def end_array(self):
+        self.f.write("]")
+
+    def write_value(self, key, value):
+        self.f.write(("" if self.first_section else ", ") + json.dumps(key) + ": ")
+        self.f.write(json.dumps(value))
+        self.first_section = False
+
+    def close(self):
+        self.f.write("}")
+        self.f.close()
+        os.replace(self.path + ".tmp", self.path)
+
+
+class DatasetSink:
+    """Collects sections into an in-memory dataset."""
+
+    def __init__(self):
+        self.dataset = {}
+        self.key = None
+
+    def begin_array(self, key):
+        self.key = key
+        self.dataset[key] = []
+
+    def write_items(self, items):
+        self.dataset[self.key].extend(items)
+
+    def end_array(self):
+        self.key = None
+
+    def write_value(self, key, value):
+        self.dataset[key] = value
+
+    def close(self):
+        pass
+
+
+def iter_dataset_sections(dataset):
+    """Yield the sections of an in-memory dataset like iter_json_sections()."""
+    for key, value in dataset.items():
+        if isinstance(value, list) and value:
+            for item in value:
+                yield key, item, True
+        else:
+            yield key, value, False
+
+
+def run_fused_pass(sections, steps, sink, chunk_size=PIPELINE_CHUNK_SIZE):
+    """Run consecutive steps in a single pass over the dataset sections.
+
+    Categories and images are collected and transformed as a whole. Annotations
+    are streamed through all steps chunk by chunk once the sections the steps
+    need have been processed; if they come first in the file, they are buffered.
+    """
+    needs = {section for step in steps for section in step.needs}
+    processed = set()
+    collected = {}
+    buffered = []
+    chunk = []
+    streaming = False
+    current_key = None
+
+    def transform(key, value):
+        for step in steps:
+            if key == "categories":
+                value = step.categories(value)
+            elif key == "images":
+                value = step.images(value)
+        processed.add(key)
+        return value
+
+    def write_annotations(anns):
+        for step in steps:
+            anns = step.annotations(anns)
+        sink.write_items(anns)
+
+    def finish_section(key):
+        nonlocal streaming, chunk
+        if key == "annotations":
+            if streaming:
+                write_annotations(chunk)
+                chunk = []
+                sink.end_array()
+                streaming = False
+        elif key in collected:
+            items = collected.pop(key)
+            sink.write_value(key, transform(key, items))
+
+    for key, item, in_array in sections:
+        if key != current_key:
+            finish_section(current_key)
+            current_key = key
+
+        if not in_array:
+            if key in ("categories", "images"):
+                item = transform(key, item)
+            sink.write_value(key, item)
+        elif key != "annotations":
+            collected.setdefault(key, []).append(item)
+        elif streaming or needs <= processed:
+            if not streaming:
+                sink.begin_array("annotations")
+                streaming = True
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                write_annotations(chunk)
+                chunk = []
+        else:
+            buffered.append(item)
+    finish_section(current_key)
+
+    # Annotations that came before the sections they depend on
+    if buffered:
+        sink.begin_array("annotations")
+        for start in range(0, len(buffered), chunk_size):
+            write_annotations(buffered[start : start + chunk_size])
+        sink.end_array()
+    sink.close()
+
+
+def build_steps(pipeline, base_dir):
+    """Instantiate the steps of a pipeline definition."""
+    steps = []
+    for spec in pipeline.get("steps", []):
+        spec = dict(spec)
+        name = spec.pop("op")
+        if name not in OPERATIONS:
+            raise ValueError(
+                f"Unknown pipeline operation '{name}', "
+                f"available: {', '.join(OPERATIONS)}"
+            )
+        steps.append((name, OPERATIONS[name](base_dir, **spec)))
+    return steps
+
+
+def run_pipeline(pipeline, input_file, output_file, base_dir="."):
+    """Run a pipeline definition on an annotation file.
+
+    Consecutive steps are fused into one pass; the dataset is only materialized
+    in memory around barrier steps. Without barrier steps the input is read and
+    the output written exactly once while streaming. Returns the statistics of
+    every step.
+    """
+    steps = build_steps(pipeline, base_dir)
+
+    # Group the steps into fused passes separated by barrier steps
+    stages = []
+    fused = []
+    for name, step in steps:
+        if step.barrier:
+            stages.append(("fused", fused))
+            stages.append(("barrier", [step]))
+            fused = []
+        else:
+            fused.append(step)
+    stages.append(("fused", fused))
+
+    sections = iter_json_sections(input_file)
+    dataset = None
+    for i, (kind, stage_steps) in enumerate(stages):
+        if kind == "barrier":
+            dataset = stage_steps[0].dataset(dataset)
+            sections = iter_dataset_sections(dataset)
+            continue
+        if i == len(stages) - 1:
+            run_fused_pass(sections, stage_steps, JsonSink(output_file))
+        elif stage_steps or dataset is None:
+            sink = DatasetSink()
+            run_fused_pass(sections, stage_steps, sink)
+            dataset = sink.dataset
+
+    return [(name, step.stats) for name, step in steps]
+
+
+def load_pipeline(path):
+    """Load a pipeline definition from a JSON or YAML file."""
+    with open(path, "r") as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            if yaml is None:
+                raise ImportError("PyYAML is required for YAML pipeline files")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a pipeline of dataset operations without the GUI."
+    )
+    parser.add_argument("pipeline", help="Pipeline definition (JSON or YAML)")
+    parser.add_argument("--input", help="Input annotation file (overrides 'input')")
+    parser.add_argument("--output", help="Output annotation file (overrides 'output')")
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.pipeline)
+    base_dir = os.path.dirname(os.path.abspath(args.pipeline))
+    input_file = args.input or os.path.join(base_dir, pipeline["input"])
+    output_file = args.output or os.path.join(base_dir, pipeline["output"])
+
+    start = time.perf_counter()
+    stats = run_pipeline(pipeline, input_file, output_file, base_dir)
+    for name, step_stats in stats:
+        print(f"{name}: {step_stats}")
+    print(f"Wrote {output_file} in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
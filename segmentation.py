@@ -0,0 +1,417 @@
+import itertools
+import math
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+from pycocotools import mask as mask_utils
+
+# Number of full resolution RLE masks decoded per batch
+RLE_DECODE_BATCH_SIZE = 16
+
+# Maximum number of RLE masks passed to a single pycocotools area() call
+RLE_AREA_BATCH_SIZE = 255
+
+# Number of annotations handled per worker task when recomputing geometry
+GEOMETRY_CHUNK_SIZE = 50000
+
+# Absolute tolerance below which area and bbox values count as unchanged
+GEOMETRY_TOLERANCE = 1e-2
+
+
+def is_polygon_segmentation(segmentation):
+    """Return True if the segmentation is given as a list of polygons."""
+    return isinstance(segmentation, list) and len(segmentation) > 0
+
+
+def is_rle_segmentation(segmentation):
+    """Return True if the segmentation is given as (un)compressed RLE."""
+    return isinstance(segmentation, dict) and "counts" in segmentation
+
+
+def valid_polygons(segmentation):
+    """Return the polygons of a segmentation that can be rasterized."""
+    return [
+        poly
+        for poly in segmentation
+        if isinstance(poly, list) and len(poly) >= 6 and len(poly) % 2 == 0
+    ]
+
+
+def rle_from_segmentation(segmentation, height, width):
+    """Convert an RLE segmentation to compressed RLE."""
+    if isinstance(segmentation["counts"], list):
+        height, width = segmentation.get("size", (height, width))
+        return mask_utils.frPyObjects(segmentation, height, width)
+    return segmentation
+
+
+def polygon_window(points, out_width, out_height):
+    """Return the (x0, y0, x1, y1) pixel window covering the given (N, 2) points."""
+    (low_x, low_y), (high_x, high_y) = points.min(axis=0), points.max(axis=0)
+    x0 = min(max(math.floor(low_x), 0), out_width)
+    y0 = min(max(math.floor(low_y), 0), out_height)
+    x1 = min(max(math.ceil(high_x) + 1, x0), out_width)
+    y1 = min(max(math.ceil(high_y) + 1, y0), out_height)
+    return x0, y0, x1, y1
+
+
+def decode_masks_at_size(anns, image_width, image_height, out_width, out_height):
+    """Decode the segmentations of the given annotations at display resolution.
+
+    Every mask is only decoded inside its bbox window, so the cost grows with the
+    covered area instead of the frame size. Polygons are scaled and rasterized
+    directly at the output size, RLE masks are decoded in batches and downsampled
+    with nearest-neighbour indexing. Returns a list of (annotation index, x0, y0,
+    boolean window mask) tuples.
+    """
+    scale = np.array([out_width / image_width, out_height / image_height])
+
+    masks = []
+    rle_segmentations = []
+    rle_owners = []
+    for i, ann in enumerate(anns):
+        segmentation = ann.get("segmentation")
+        if is_rle_segmentation(segmentation):
+            rle_segmentations.append(segmentation)
+            rle_owners.append(i)
+            continue
+        if not is_polygon_segmentation(segmentation):
+            continue
+        polygons = valid_polygons(segmentation)
+        if not polygons:
+            continue
+
+        # Rasterize the polygons of the annotation into its own window, so no
+        # full frame mask is ever allocated
+        points = np.concatenate(polygons).astype(np.float64).reshape(-1, 2) * scale
+        x0, y0, x1, y1 = polygon_window(points, out_width, out_height)
+        if x1 == x0 or y1 == y0:
+            continue
+        points -= (x0, y0)
+        if len(polygons) == 1:
+            rle = mask_utils.frPyObjects([points.ravel().tolist()], y1 - y0, x1 - x0)
+        else:
+            ends = np.cumsum([len(poly) // 2 for poly in polygons])[:-1]
+            shifted = [part.ravel().tolist() for part in np.split(points, ends)]
+            rle = mask_utils.frPyObjects(shifted, y1 - y0, x1 - x0)
+        masks.append((i, x0, y0, mask_utils.decode(mask_utils.merge(rle)) > 0))
+
+    # Decode RLE masks in batches of equal size and sample their windows down to
+    # the display size
+    if rle_segmentations:
+        grouped = OrderedDict()
+        for owner, segmentation in zip(rle_owners, rle_segmentations):
+            rle = rle_from_segmentation(segmentation, image_height, image_width)
+            grouped.setdefault(tuple(rle["size"]), []).append((owner, rle))
+
+        for (rle_height, rle_width), items in grouped.items():
+            ys = np.minimum(
+                (np.arange(out_height) * rle_height / out_height).astype(np.int64),
+                rle_height - 1,
+            )
+            xs = np.minimum(
+                (np.arange(out_width) * rle_width / out_width).astype(np.int64),
+                rle_width - 1,
+            )
+            # Limit the number of full resolution masks held in memory at once
+            for start in range(0, len(items), RLE_DECODE_BATCH_SIZE):
+                batch = items[start : start + RLE_DECODE_BATCH_SIZE]
+                rles = [rle for _, rle in batch]
+                decoded = mask_utils.decode(rles)
+                for j, ((owner, _), box) in enumerate(
+                    zip(batch, mask_utils.toBbox(rles))
+                ):
+                    x0 = int(np.floor(box[0] * out_width / rle_width))
+                    y0 = int(np.floor(box[1] * out_height / rle_height))
+                    x1 = min(
+                        int(np.ceil((box[0] + box[2]) * out_width / rle_width)),
+                        out_width,
+                    )
+                    y1 = min(
+                        int(np.ceil((box[1] + box[3]) * out_height / rle_height)),
+                        out_height,
+                    )
+                    window = decoded[np.ix_(ys[y0:y1], xs[x0:x1], [j])][:, :, 0]
+                    masks.append((owner, x0, y0, window.astype(bool)))
+
+    return masks
+
+
+def build_label_map(anns, image_width, image_height, out_width, out_height):
+    """Build a label map that holds the index of the topmost annotation per pixel.
+
+    Pixels that are not covered by any mask are set to -1.
+    """
+    label_map = np.full((out_height, out_width), -1, dtype=np.int32)
+    masks = decode_masks_at_size(anns, image_width, image_height, out_width, out_height)
+
+    # Later annotations are drawn on top of earlier ones, each only inside its window
+    for owner, x0, y0, mask in sorted(masks, key=lambda item: item[0]):
+        height, width = mask.shape
+        np.copyto(label_map[y0 : y0 + height, x0 : x0 + width], owner, where=mask)
+
+    return label_map
+
+
+def composite_label_map(image, label_map, colors, alpha=0.5):
+    """Blend the colored label map onto the RGB image in place in one array operation.
+
+    `colors` is an (N, 3) array with one RGB color per annotation index.
+    """
+    covered = label_map >= 0
+    if not covered.any():
+        return
+
+    image_array = np.asarray(image, dtype=np.float32)
+    color_layer = np.asarray(colors, dtype=np.float32)[label_map[covered]]
+    image_array[covered] = image_array[covered] * (1.0 - alpha) + color_layer * alpha
+
+    image.paste(Image.fromarray(image_array.astype(np.uint8)))
+
+
+class MaskOverlayCache:
+    """Least-recently-used cache of label maps keyed by image ID and display size."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, image_id, size):
+        """Return the cached label map or None."""
+        key = (image_id, size)
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, image_id, size, label_map):
+        """Store a label map, evicting the least recently used entry if full."""
+        self.entries[(image_id, size)] = label_map
+        self.entries.move_to_end((image_id, size))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, image_id=None):
+        """Drop the entries of one image, or all entries if no image ID is given."""
+        if image_id is None:
+            self.entries.clear()
+            return
+        for key in [key for key in self.entries if key[0] == image_id]:
+            del self.entries[key]
+
+
+def polygon_geometry(segmentations):
+    """Compute areas and tight bboxes for polygon segmentations.
+
+    All polygons are flattened into one coordinate array, so the shoelace formula
+    and the bbox extrema are evaluated with a few vectorized reductions. Rows of
+    annotations without a valid polygon are NaN.
+    """
+    areas = np.full(len(segmentations), np.nan)
+    bboxes = np.full((len(segmentations), 4), np.nan)
+
+    polygons = []
+    owners = []
+    for i, segmentation in enumerate(segmentations):
+        for poly in valid_polygons(segmentation):
+            polygons.append(poly)
+            owners.append(i)
+    if not polygons:
+        return areas, bboxes
+
+    lengths = np.fromiter((len(poly) // 2 for poly in polygons), dtype=np.int64)
+    coords = np.fromiter(
+        itertools.chain.from_iterable(polygons),
+        dtype=np.float64,
+        count=int(lengths.sum()) * 2,
+    ).reshape(-1, 2)
+    xs, ys = coords[:, 0], coords[:, 1]
+
+    # Index of the next vertex, wrapping around at the end of each polygon
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    next_index = np.arange(len(xs)) + 1
+    next_index[starts + lengths - 1] = starts
+
+    cross = xs * ys[next_index] - xs[next_index] * ys
+    polygon_areas = 0.5 * np.abs(np.add.reduceat(cross, starts))
+    polygon_min_x = np.minimum.reduceat(xs, starts)
+    polygon_min_y = np.minimum.reduceat(ys, starts)
+    polygon_max_x = np.maximum.reduceat(xs, starts)
+    polygon_max_y = np.maximum.reduceat(ys, starts)
+
+    # Polygons of one annotation are contiguous, reduce them per annotation
+    owners = np.asarray(owners)
+    owner_starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    owner_ids = owners[owner_starts]
+    min_x = np.minimum.reduceat(polygon_min_x, owner_starts)
+    min_y = np.minimum.reduceat(polygon_min_y, owner_starts)
+    max_x = np.maximum.reduceat(polygon_max_x, owner_starts)
+    max_y = np.maximum.reduceat(polygon_max_y, owner_starts)
+
+    areas[owner_ids] = np.add.reduceat(polygon_areas, owner_starts)
+    bboxes[owner_ids] = np.stack([min_x, min_y, max_x - min_x, max_y - min_y], axis=1)
+
+    return areas, bboxes
+
+
+def rle_geometry(segmentations, heights, widths):
+    """Compute areas and tight bboxes for RLE segmentations in one batch."""
+    if not segmentations:
+        return np.zeros(0), np.zeros((0, 4))
+    rles = [
+        rle_from_segmentation(segmentation, height, width)
+        for segmentation, height, width in zip(segmentations, heights, widths)
+    ]
+    # pycocotools sizes the result of area() with a uint8 under numpy 2, so query
+    # at most RLE_AREA_BATCH_SIZE masks per call
+    areas = np.concatenate(
+        [
+            mask_utils.area(rles[start : start + RLE_AREA_BATCH_SIZE])
+            for start in range(0, len(rles), RLE_AREA_BATCH_SIZE)
+        ]
+    ).astype(np.float64)
+    bboxes = mask_utils.toBbox(rles).astype(np.float64)
+    return areas, bboxes
+
+
+def compute_geometry_chunk(chunk):
+    """Compute areas and bboxes for a chunk of (segmentation, height, width) tuples.
+
+    Runs in a worker process. Returns NaN rows for unusable segmentations.
+    """
+    areas = np.full(len(chunk), np.nan)
+    bboxes = np.full((len(chunk), 4), np.nan)
+
+    polygon_rows = []
+    rle_rows = []
+    for i, (segmentation, _, _) in enumerate(chunk):
+        if is_rle_segmentation(segmentation):
+            rle_rows.append(i)
+        elif is_polygon_segmentation(segmentation):
+            polygon_rows.append(i)
+
+    if polygon_rows:
+        areas[polygon_rows], bboxes[polygon_rows] = polygon_geometry(
+            [chunk[i][0] for i in polygon_rows]
+        )
+    if rle_rows:
+        areas[rle_rows], bboxes[rle_rows] = rle_geometry(
+            [chunk[i][0] for i in rle_rows],
+            [chunk[i][1] for i in rle_rows],
+            [chunk[i][2] for i in rle_rows],
+        )
+
+    return areas, bboxes
+
+
+def existing_geometry(anns):
+    """Return the stored areas and bboxes of the annotations, NaN where missing."""
+    areas = np.fromiter(
+        (
+            ann["area"] if isinstance(ann.get("area"), (int, float)) else np.nan
+            for ann in anns
+        ),
+        dtype=np.float64,
+        count=len(anns),
+    )
+    bboxes = np.array(
+        [
+            (
+                ann["bbox"]
+                if isinstance(ann.get("bbox"), list) and len(ann["bbox"]) == 4
+                else [np.nan] * 4
+            )
+            for ann in anns
+        ],
+        dtype=np.float64,
+    ).reshape(-1, 4)
+    return areas, bboxes
+
+
+def segmented_annotations(anns):
+    """Return the annotations with a polygon or RLE segmentation."""
+    return [
+        ann
+        for ann in anns
+        if is_polygon_segmentation(ann.get("segmentation"))
+        or is_rle_segmentation(ann.get("segmentation"))
+    ]
+
+
+def update_geometry(anns, new_areas, new_bboxes):
+    """Write recomputed areas and bboxes that differ from the stored ones.
+
+    Values within GEOMETRY_TOLERANCE count as unchanged, NaN rows of unusable
+    segmentations are skipped. The annotations are updated in place. Returns
+    the change counts and one entry per changed annotation.
+    """
+    old_areas, old_bboxes = existing_geometry(anns)
+
+    # Compare old and new values in one pass over the arrays
+    valid = ~np.isnan(new_areas)
+    area_changed = valid & ~(np.abs(new_areas - old_areas) <= GEOMETRY_TOLERANCE)
+    bbox_changed = valid & ~np.all(
+        np.abs(new_bboxes - old_bboxes) <= GEOMETRY_TOLERANCE, axis=1
+    )
+
+    changes = []
+    for i in np.flatnonzero(area_changed | bbox_changed):
+        ann = anns[i]
+        change = {"id": ann.get("id"), "image_id": ann.get("image_id")}
+        if area_changed[i]:
+            change["old_area"] = ann.get("area")
+            change["new_area"] = float(new_areas[i])
+            ann["area"] = change["new_area"]
+        if bbox_changed[i]:
+            change["old_bbox"] = ann.get("bbox")
+            change["new_bbox"] = [float(value) for value in new_bboxes[i]]
+            ann["bbox"] = change["new_bbox"]
+        changes.append(change)
+
+    return {
+        "num_skipped": int(np.count_nonzero(~valid)),
+        "num_area_changed": int(np.count_nonzero(area_changed)),
+        "num_bbox_changed": int(np.count_nonzero(bbox_changed)),
+        "changes": changes,
+    }
+
+
+def recompute_geometry(dataset, max_workers=None, chunk_size=GEOMETRY_CHUNK_SIZE):
+    """Recompute 'area' and 'bbox' of all annotations from their segmentation.
+
+    Annotations without a usable segmentation are left untouched. The dataset is
+    updated in place and a report listing every changed annotation is returned.
+    """
+    image_sizes = {
+        img["id"]: (img.get("height"), img.get("width"))
+        for img in dataset.get("images", [])
+    }
+    anns = segmented_annotations(dataset.get("annotations", []))
+    tasks = [
+        (ann["segmentation"],) + image_sizes.get(ann["image_id"], (None, None))
+        for ann in anns
+    ]
+    chunks = [tasks[i : i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+    # Only pay for worker processes if there is more than one chunk
+    if len(chunks) > 1:
+        max_workers = max_workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(compute_geometry_chunk, chunks))
+    else:
+        results = [compute_geometry_chunk(chunk) for chunk in chunks]
+
+    if results:
+        new_areas = np.concatenate([areas for areas, _ in results])
+        new_bboxes = np.concatenate([bboxes for _, bboxes in results])
+    else:
+        new_areas, new_bboxes = np.zeros(0), np.zeros((0, 4))
+
+    return {
+        "num_annotations": len(dataset.get("annotations", [])),
+        "num_with_segmentation": len(anns),
+        **update_geometry(anns, new_areas, new_bboxes),
+    }
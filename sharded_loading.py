@@ -0,0 +1,138 @@
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from category_matching import normalize_category_name
+
+
+def is_shard_source(path):
+    """Return True if the path is a directory or glob pattern of annotation shards."""
+    return os.path.isdir(path) or glob.has_magic(path)
+
+
+def find_shards(shard_source):
+    """Return the sorted annotation shard files of a directory or glob pattern."""
+    if os.path.isdir(shard_source):
+        shard_source = os.path.join(shard_source, "*.json")
+    return sorted(path for path in glob.glob(shard_source) if os.path.isfile(path))
+
+
+def load_shard(path):
+    """Parse one annotation shard. Runs in a worker process."""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def reconcile_categories(shards):
+    """Build one category table for all shards, matching categories by normalized name.
+
+    A category keeps the ID it has in the first shard that contains it, unless
+    that ID is already taken by a different name. Returns the merged categories
+    and one {old ID: new ID} mapping per shard.
+    """
+    categories = []
+    name_to_id = {}
+    used_ids = set()
+    pending = []
+
+    # First pass: keep original IDs where possible
+    for shard in shards:
+        for cat in shard.get("categories", []):
+            name = normalize_category_name(cat["name"])
+            if name in name_to_id:
+                continue
+            if cat["id"] in used_ids:
+                name_to_id[name] = None
+                pending.append(cat)
+                continue
+            name_to_id[name] = cat["id"]
+            used_ids.add(cat["id"])
+            categories.append(dict(cat))
+
+    # Second pass: assign free IDs to names whose original ID was taken
+    next_id = max(used_ids, default=0) + 1
+    for cat in pending:
+        name = normalize_category_name(cat["name"])
+        if name_to_id[name] is not None:
+            continue
+        name_to_id[name] = next_id
+        categories.append(dict(cat, id=next_id))
+        next_id += 1
+
+    mappings = [
+        {
+            cat["id"]: name_to_id[normalize_category_name(cat["name"])]
+            for cat in shard.get("categories", [])
+        }
+        for shard in shards
+    ]
+    return categories, mappings
+
+
+def merge_shards(shards, shard_names):
+    """Merge parsed shards into one dataset with globally unique IDs.
+
+    Returns the merged dataset and a mapping from new image IDs to shard names.
+    """
+    categories, category_mappings = reconcile_categories(shards)
+    merged = dict(shards[0]) if shards else {}
+    merged["categories"] = categories
+    merged["images"] = []
+    merged["annotations"] = []
+    image_id_to_shard = {}
+
+    next_image_id = 1
+    next_ann_id = 1
+    for shard, shard_name, category_mapping in zip(
+        shards, shard_names, category_mappings
+    ):
+        # Assign consecutive image IDs per shard
+        image_mapping = {}
+        for img in shard.get("images", []):
+            image_mapping[img["id"]] = next_image_id
+            img["id"] = next_image_id
+            image_id_to_shard[next_image_id] = shard_name
+            next_image_id += 1
+        merged["images"].extend(shard.get("images", []))
+
+        # Remap annotations, dropping those referencing unknown images or categories
+        for ann in shard.get("annotations", []):
+            image_id = image_mapping.get(ann["image_id"])
+            category_id = category_mapping.get(ann["category_id"])
+            if image_id is None or category_id is None:
+                continue
+            ann["image_id"] = image_id
+            ann["category_id"] = category_id
+            ann["id"] = next_ann_id
+            next_ann_id += 1
+            merged["annotations"].append(ann)
+
+    return merged, image_id_to_shard
+
+
+def load_sharded_dataset(shard_source, max_workers=None):
+    """Load all annotation shards of a directory or glob pattern in parallel.
+
+    Shards are parsed in a process pool with one worker per CPU by default. With
+    a single CPU or a single shard they are parsed sequentially, where the pool
+    would only add the cost of pickling every parsed shard back to the parent.
+    Returns the merged dataset, the image ID to shard name mapping and the number
+    of bytes read.
+    """
+    paths = find_shards(shard_source)
+    if not paths:
+        raise FileNotFoundError(f"No annotation shards found in {shard_source}")
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            shards = list(executor.map(load_shard, paths))
+    else:
+        shards = [load_shard(path) for path in paths]
+
+    shard_names = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    merged, image_id_to_shard = merge_shards(shards, shard_names)
+    bytes_read = sum(os.path.getsize(path) for path in paths)
+
+    return merged, image_id_to_shard, bytes_read
@@ -0,0 +1,214 @@
+import json
+import os
+import re
+
+import numpy as np
+
+# Default split names and ratios
+DEFAULT_SPLITS = {"train": 0.8, "val": 0.1, "test": 0.1}
+
+
+def find_image_groups(images, group_pattern=None):
+    """Assign a group index to every image based on a regex applied to 'file_name'.
+
+    The first capture group (or the whole match) is used as group key, so e.g.
+    `^(.*)_frame\\d+` keeps all frames of a sequence together. Images that do not
+    match form a group of their own. Returns an array of group indices.
+    """
+    group_indices = np.empty(len(images), dtype=np.int64)
+    if not group_pattern:
+        group_indices[:] = np.arange(len(images))
+        return group_indices
+
+    pattern = re.compile(group_pattern)
+    group_keys = {}
+    for i, img in enumerate(images):
+        match = pattern.search(img.get("file_name", ""))
+        if match:
+            key = ("match", match.group(1) if match.groups() else match.group(0))
+        else:
+            key = ("image", img["id"])
+        group_indices[i] = group_keys.setdefault(key, len(group_keys))
+
+    return group_indices
+
+
+def build_group_label_matrix(dataset, group_indices):
+    """Build the sparse group-by-category incidence matrix of a dataset.
+
+    Each entry counts the images of a group that contain the category. Returns the
+    non-zero entries as (group, category, count) arrays sorted by group.
+    """
+    images = dataset.get("images", [])
+    anns = dataset.get("annotations", [])
+
+    image_ids = np.fromiter((img["id"] for img in images), dtype=np.int64)
+    order = np.argsort(image_ids)
+    sorted_image_ids = image_ids[order]
+
+    ann_image_ids = np.fromiter(
+        (ann["image_id"] for ann in anns), dtype=np.int64, count=len(anns)
+    )
+    ann_category_ids = np.fromiter(
+        (ann["category_id"] for ann in anns), dtype=np.int64, count=len(anns)
+    )
+    category_ids, ann_categories = np.unique(ann_category_ids, return_inverse=True)
+
+    # Map annotation image IDs to image rows, dropping annotations of unknown images
+    positions = np.searchsorted(sorted_image_ids, ann_image_ids)
+    positions = np.minimum(positions, max(len(sorted_image_ids) - 1, 0))
+    known = (
+        sorted_image_ids[positions] == ann_image_ids
+        if len(sorted_image_ids)
+        else np.zeros(len(anns), dtype=bool)
+    )
+    image_rows = order[positions[known]]
+    ann_categories = ann_categories[known]
+
+    # Image-by-category presence, then summed per group
+    num_categories = max(len(category_ids), 1)
+    image_category = np.unique(image_rows * num_categories + ann_categories)
+    group_category = (
+        group_indices[image_category // num_categories] * num_categories
+        + image_category % num_categories
+    )
+    keys, counts = np.unique(group_category, return_counts=True)
+
+    return keys // num_categories, keys % num_categories, counts, category_ids
+
+
+def iterative_stratification(
+    num_groups, group_rows, category_columns, counts, group_sizes, ratios, seed=0
+):
+    """Assign groups to subsets with iterative multi-label stratification.
+
+    Follows Sechidis et al.: the category with the fewest remaining groups is
+    distributed first, each of its groups going to the subset that still needs
+    most of that category. Runs in O(non-zero entries * subsets + categories^2).
+    Returns an array with the subset index of every group.
+    """
+    rng = np.random.default_rng(seed)
+    ratios = np.asarray(ratios, dtype=np.float64)
+    ratios = ratios / ratios.sum()
+    num_categories = int(category_columns.max()) + 1 if len(category_columns) else 0
+
+    # Random processing order makes tie-breaking deterministic for a given seed
+    rank = np.empty(num_groups, dtype=np.int64)
+    rank[rng.permutation(num_groups)] = np.arange(num_groups)
+
+    # Row slices of the incidence matrix per group (entries are sorted by group)
+    group_starts = np.searchsorted(group_rows, np.arange(num_groups + 1))
+
+    # Column lists per category, groups ordered by their random rank
+    by_category = np.lexsort((rank[group_rows], category_columns))
+    category_starts = np.searchsorted(
+        category_columns[by_category], np.arange(num_categories + 1)
+    )
+    category_groups = group_rows[by_category]
+
+    label_totals = np.bincount(
+        category_columns, weights=counts, minlength=num_categories
+    )
+    desired_labels = ratios[:, None] * label_totals[None, :]
+    desired_totals = ratios * group_sizes.sum()
+    remaining = np.bincount(category_columns, minlength=num_categories)
+    assignment = np.full(num_groups, -1, dtype=np.int64)
+
+    def assign(group, preference):
+        # Pick the subset with the highest preference, then the largest need overall
+        candidates = np.flatnonzero(preference == preference.max())
+        if len(candidates) > 1:
+            totals = desired_totals[candidates]
+            candidates = candidates[totals == totals.max()]
+        subset = candidates[0] if len(candidates) == 1 else rng.choice(candidates)
+
+        start, end = group_starts[group], group_starts[group + 1]
+        desired_labels[subset, category_columns[start:end]] -= counts[start:end]
+        desired_totals[subset] -= group_sizes[group]
+        remaining[category_columns[start:end]] -= 1
+        assignment[group] = subset
+
+    while np.any(remaining > 0):
+        # Category with the fewest unassigned groups left
+        pending = np.where(remaining > 0, remaining, np.iinfo(np.int64).max)
+        category = int(pending.argmin())
+        start, end = category_starts[category], category_starts[category + 1]
+        for group in category_groups[start:end]:
+            if assignment[group] < 0:
+                assign(group, desired_labels[:, category])
+
+    # Groups without any annotation only balance the overall size
+    for group in np.argsort(rank):
+        if assignment[group] < 0:
+            assign(group, desired_totals)
+
+    return assignment
+
+
+def stratified_split(dataset, ratios, group_pattern=None, seed=0):
+    """Split the images of a dataset into subsets with the given ratios.
+
+    Returns a dictionary mapping image IDs to subset indices.
+    """
+    images = dataset.get("images", [])
+    group_indices = find_image_groups(images, group_pattern)
+    num_groups = int(group_indices.max()) + 1 if len(group_indices) else 0
+    group_sizes = np.bincount(group_indices, minlength=num_groups)
+
+    group_rows, category_columns, counts, _ = build_group_label_matrix(
+        dataset, group_indices
+    )
+    group_assignment = iterative_stratification(
+        num_groups, group_rows, category_columns, counts, group_sizes, ratios, seed
+    )
+
+    return {
+        img["id"]: int(subset)
+        for img, subset in zip(images, group_assignment[group_indices])
+    }
+
+
+def write_splits(dataset, image_split, split_names, output_dir, base_name):
+    """Write one COCO annotation file per split in a single streaming pass.
+
+    Images and annotations are serialized one by one to the file of their split
+    instead of building a copy of the dataset per split. Returns the file paths.
+    """
+    paths = [
+        os.path.join(output_dir, f"{base_name}_{split_name}.json")
+        for split_name in split_names
+    ]
+    header = "".join(
+        f"{json.dumps(key)}: {json.dumps(value)}, "
+        for key, value in dataset.items()
+        if key not in ("images", "annotations")
+    )
+
+    files = [open(path, "w") for path in paths]
+    try:
+        first = [True] * len(files)
+
+        def write_item(split, item):
+            files[split].write(("" if first[split] else ", ") + json.dumps(item))
+            first[split] = False
+
+        for f in files:
+            f.write("{" + header + '"images": [')
+        for img in dataset.get("images", []):
+            if img["id"] in image_split:
+                write_item(image_split[img["id"]], img)
+
+        first[:] = [True] * len(files)
+        for f in files:
+            f.write('], "annotations": [')
+        for ann in dataset.get("annotations", []):
+            if ann["image_id"] in image_split:
+                write_item(image_split[ann["image_id"]], ann)
+
+        for f in files:
+            f.write("]}")
+    finally:
+        for f in files:
+            f.close()
+
+    return paths
@@ -0,0 +1,375 @@
+import json
+import os
+import sqlite3
+
+# Characters read from the annotation file per chunk while streaming
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Number of rows inserted per executemany call during ingestion
+INSERT_BATCH_SIZE = 10000
+
+# Version of the database layout, databases of other versions are rebuilt
+SCHEMA_VERSION = 1
+
+JSON_WHITESPACE = " \t\n\r"
+
+
+class JsonStream:
+    """Buffered reader that decodes JSON values one by one from a file."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """Read the next chunk, dropping the consumed part of the buffer."""
+        chunk = self.f.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while (
+                self.pos < len(self.buffer) and self.buffer[self.pos] in JSON_WHITESPACE
+            ):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                raise ValueError("Unexpected end of JSON file")
+            self.fill()
+
+    def expect(self, char):
+        """Consume the given character."""
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at character {self.pos} of chunk")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_json_sections(path):
+    """Stream the top-level object of a COCO file without loading it at once.
+
+    Yields (key, item, True) for every item of a top-level array and
+    (key, value, False) for all other values, including empty arrays, so arrays
+    of millions of entries never have to be held in memory.
+    """
+    with open(path, "r") as f:
+        stream = JsonStream(f)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if stream.peek() == "[":
+                stream.expect("[")
+                if stream.peek() == "]":
+                    stream.pos += 1
+                    yield key, [], False
+                else:
+                    while True:
+                        yield key, stream.value(), True
+                        if stream.peek() == ",":
+                            stream.pos += 1
+                            continue
+                        stream.expect("]")
+                        break
+            else:
+                yield key, stream.value(), False
+            if stream.peek() == ",":
+                stream.pos += 1
+                continue
+            stream.expect("}")
+            return
+
+
+def database_path_for(annotation_file):
+    """Return the path of the database file caching an annotation file."""
+    return os.path.splitext(annotation_file)[0] + ".sqlite"
+
+
+def source_signature(annotation_file):
+    """Return a string identifying the current version of the annotation file."""
+    stat = os.stat(annotation_file)
+    return f"{SCHEMA_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def ingest_annotation_file(annotation_file, db_path):
+    """Stream an annotation file into a new SQLite database."""
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE sections (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE list_items (key TEXT, value TEXT);
+            CREATE TABLE categories (id INTEGER, data TEXT);
+            CREATE TABLE images (id INTEGER, file_name TEXT, data TEXT);
+            CREATE TABLE annotations (
+                id INTEGER, image_id INTEGER, category_id INTEGER, data TEXT
+            );
+            """)
+
+        batches = {"categories": [], "images": [], "annotations": [], "other": []}
+        statements = {
+            "categories": "INSERT INTO categories VALUES (?, ?)",
+            "images": "INSERT INTO images VALUES (?, ?, ?)",
+            "annotations": "INSERT INTO annotations VALUES (?, ?, ?, ?)",
+            "other": "INSERT INTO list_items VALUES (?, ?)",
+        }
+
+        def flush(table):
+            connection.executemany(statements[table], batches[table])
+            batches[table].clear()
+
+        for key, item, in_array in iter_json_sections(annotation_file):
+            data = json.dumps(item)
+            if not in_array:
+                # Scalars, objects and empty arrays are stored as a whole
+                if key not in ("categories", "images", "annotations"):
+                    connection.execute(
+                        "INSERT OR REPLACE INTO sections VALUES (?, ?)", (key, data)
+                    )
+                continue
+            if key == "annotations":
+                row = (item["id"], item["image_id"], item["category_id"], data)
+                table = "annotations"
+            elif key == "images":
+                row = (item["id"], item.get("file_name"), data)
+                table = "images"
+            elif key == "categories":
+                row = (item["id"], data)
+                table = "categories"
+            else:
+                row, table = (key, data), "other"
+            batches[table].append(row)
+            if len(batches[table]) >= INSERT_BATCH_SIZE:
+                flush(table)
+
+        for table in batches:
+            flush(table)
+
+        # Indexes are created after the bulk insert, which is much faster
+        connection.executescript("""
+            CREATE INDEX images_id ON images (id);
+            CREATE INDEX categories_id ON categories (id);
+            CREATE INDEX annotations_id ON annotations (id);
+            CREATE INDEX annotations_image_id ON annotations (image_id);
+            CREATE INDEX annotations_category_id ON annotations (category_id);
+            """)
+        connection.execute(
+            "INSERT INTO meta VALUES ('source_signature', ?)",
+            (source_signature(annotation_file),),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(tmp_path, db_path)
+
+
+def open_database(annotation_file, db_path=None):
+    """Open the database of an annotation file, ingesting it if it is missing or stale."""
+    db_path = db_path or database_path_for(annotation_file)
+    if os.path.exists(db_path):
+        connection = sqlite3.connect(db_path)
+        try:
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = 'source_signature'"
+            ).fetchone()
+        except sqlite3.DatabaseError:
+            row = None
+        if row and row[0] == source_signature(annotation_file):
+            return connection
+        connection.close()
+
+    ingest_annotation_file(annotation_file, db_path)
+    return sqlite3.connect(db_path)
+
+
+def as_id_list(ids):
+    """Normalize a single ID or an iterable of IDs to a list."""
+    if ids is None:
+        return []
+    if isinstance(ids, (list, tuple, set)):
+        return list(ids)
+    return [ids]
+
+
+class SQLiteCOCO:
+    """Read-only COCO API backed by an SQLite database.
+
+    Provides the subset of pycocotools' COCO interface used by the GUI. Only the
+    categories are kept in memory, images and annotations are paged in on demand
+    through indexed queries, so memory stays bounded for any dataset size.
+    """
+
+    def __init__(self, annotation_file, db_path=None):
+        self.annotation_file = annotation_file
+        self.connection = open_database(annotation_file, db_path)
+        self.cats = {
+            cat_id: json.loads(data)
+            for cat_id, data in self.connection.execute(
+                "SELECT id, data FROM categories ORDER BY rowid"
+            )
+        }
+
+    def query_ids(self, sql, params=()):
+        return [row[0] for row in self.connection.execute(sql, params)]
+
+    def getImgIds(self, imgIds=[], catIds=[]):
+        """Return image IDs, optionally restricted to IDs and categories."""
+        img_ids = as_id_list(imgIds)
+        cat_ids = as_id_list(catIds)
+        if not img_ids and not cat_ids:
+            return self.query_ids("SELECT id FROM images ORDER BY rowid")
+
+        ids = set(img_ids) if img_ids else None
+        for cat_id in cat_ids:
+            cat_img_ids = set(
+                self.query_ids(
+                    "SELECT DISTINCT image_id FROM annotations WHERE category_id = ?",
+                    (cat_id,),
+                )
+            )
+            ids = cat_img_ids if ids is None else ids & cat_img_ids
+        return list(ids)
+
+    def getAnnIds(self, imgIds=[], catIds=[], areaRng=[], iscrowd=None):
+        """Return annotation IDs of the given images and categories."""
+        img_ids = as_id_list(imgIds)
+        cat_ids = as_id_list(catIds)
+        conditions = []
+        params = []
+        if img_ids:
+            conditions.append(f"image_id IN ({','.join('?' * len(img_ids))})")
+            params.extend(img_ids)
+        if cat_ids:
+            conditions.append(f"category_id IN ({','.join('?' * len(cat_ids))})")
+            params.extend(cat_ids)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if not areaRng and iscrowd is None:
+            return self.query_ids(
+                f"SELECT id FROM annotations{where} ORDER BY rowid", params
+            )
+
+        anns = self.query_anns(where, params)
+        if areaRng:
+            anns = [ann for ann in anns if areaRng[0] < ann["area"] < areaRng[1]]
+        if iscrowd is not None:
+            anns = [ann for ann in anns if ann.get("iscrowd", 0) == iscrowd]
+        return [ann["id"] for ann in anns]
+
+    def getCatIds(self, catNms=[], supNms=[], catIds=[]):
+        """Return category IDs, optionally filtered by names and supercategories."""
+        cats = list(self.cats.values())
+        if catNms:
+            cats = [cat for cat in cats if cat["name"] in catNms]
+        if supNms:
+            cats = [cat for cat in cats if cat.get("supercategory") in supNms]
+        if catIds:
+            cats = [cat for cat in cats if cat["id"] in catIds]
+        return [cat["id"] for cat in cats]
+
+    def query_anns(self, where, params):
+        return [
+            json.loads(row[0])
+            for row in self.connection.execute(
+                f"SELECT data FROM annotations{where} ORDER BY rowid", params
+            )
+        ]
+
+    def load_rows(self, table, ids):
+        """Load JSON rows of a table in the order of the given IDs."""
+        ids = as_id_list(ids)
+        rows = {}
+        # Stay below SQLite's limit of bound parameters per statement
+        for start in range(0, len(ids), 900):
+            batch = ids[start : start + 900]
+            for row_id, data in self.connection.execute(
+                f"SELECT id, data FROM {table} "
+                f"WHERE id IN ({','.join('?' * len(batch))})",
+                batch,
+            ):
+                rows[row_id] = json.loads(data)
+        return [rows[row_id] for row_id in ids if row_id in rows]
+
+    def loadImgs(self, ids=[]):
+        return self.load_rows("images", ids)
+
+    def loadAnns(self, ids=[]):
+        return self.load_rows("annotations", ids)
+
+    def loadCats(self, ids=[]):
+        return [self.cats[cat_id] for cat_id in as_id_list(ids) if cat_id in self.cats]
+
+    def createIndex(self):
+        """The database indexes are always up to date."""
+
+    def count(self, table):
+        """Return the number of rows of 'images', 'annotations' or 'categories'."""
+        return self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def iter_file_names(self):
+        """Iterate over (image ID, file name) of all images."""
+        return self.connection.execute(
+            "SELECT id, file_name FROM images ORDER BY rowid"
+        )
+
+    def write_json(self, output_file):
+        """Stream the dataset to a COCO JSON file without loading it into memory."""
+        with open(output_file, "w") as f:
+            f.write("{")
+            for key, data in self.connection.execute("SELECT key, value FROM sections"):
+                f.write(f"{json.dumps(key)}: {data}, ")
+
+            # Other top-level lists, e.g. licenses
+            list_keys = self.query_ids("SELECT DISTINCT key FROM list_items")
+            for key in list_keys:
+                f.write(f"{json.dumps(key)}: [")
+                rows = self.connection.execute(
+                    "SELECT value FROM list_items WHERE key = ? ORDER BY rowid", (key,)
+                )
+                f.write(", ".join(row[0] for row in rows))
+                f.write("], ")
+
+            for i, table in enumerate(("categories", "images", "annotations")):
+                f.write(f'"{table}": [')
+                first = True
+                for (data,) in self.connection.execute(
+                    f"SELECT data FROM {table} ORDER BY rowid"
+                ):
+                    f.write(data if first else ", " + data)
+                    first = False
+                f.write("]" + (", " if i < 2 else ""))
+            f.write("}")
+
+    def close(self):
+        self.connection.close()
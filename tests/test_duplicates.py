@@ -0,0 +1,78 @@
+import numpy as np
+
+import duplicates
+from duplicates import find_overlaps, overlapping_pairs, remove_duplicates
+
+
+def box_annotation(ann_id, bbox, image_id=1, category_id=1):
+    return {
+        "id": ann_id,
+        "image_id": image_id,
+        "category_id": category_id,
+        "bbox": bbox,
+    }
+
+
+def test_remove_duplicates_keeps_one_copy_of_annotations_sharing_an_id():
+    dataset = {
+        "annotations": [
+            box_annotation(5, [10, 10, 20, 20]),
+            box_annotation(5, [10, 10, 20, 20]),
+            box_annotation(6, [10, 10, 20, 20]),
+            box_annotation(7, [100, 100, 20, 20]),
+        ]
+    }
+
+    report = remove_duplicates(dataset)
+
+    assert report["redundant_rows"] == [1, 2]
+    assert [pair["rows"] for pair in report["duplicates"]] == [[0, 1], [0, 2], [1, 2]]
+    assert [ann["id"] for ann in dataset["annotations"]] == [5, 7]
+
+
+def test_find_overlaps_reports_conflicts_between_categories():
+    anns = [
+        box_annotation(1, [0, 0, 10, 10], category_id=1),
+        box_annotation(2, [0, 0, 10, 10], category_id=2),
+    ]
+
+    report = find_overlaps(anns)
+
+    assert report["duplicates"] == []
+    assert [pair["ann_ids"] for pair in report["conflicts"]] == [[1, 2]]
+    assert report["redundant_rows"] == []
+
+
+def test_dense_images_are_computed_in_tiles(monkeypatch):
+    rng = np.random.default_rng(0)
+    image_ids = rng.integers(0, 3, 300)
+    boxes = np.c_[rng.uniform(0, 50, (300, 2)), rng.uniform(5, 30, (300, 2))]
+    expected = overlapping_pairs(image_ids, boxes, 0.3)
+
+    monkeypatch.setattr(duplicates, "PAIR_BATCH_SIZE", 1000)
+    tiled = overlapping_pairs(image_ids, boxes, 0.3)
+
+    def sorted_pairs(pairs):
+        first, second, ious = pairs
+        order = np.lexsort((second, first))
+        return first[order], second[order], ious[order]
+
+    for expected_values, tiled_values in zip(
+        sorted_pairs(expected), sorted_pairs(tiled)
+    ):
+        np.testing.assert_allclose(expected_values, tiled_values)
+    assert np.all(tiled[0] < tiled[1])
+
+
+def test_chains_of_boxes_are_suppressed_in_row_order():
+    # Neighbours overlap with IoU 0.905, the two ends only with IoU 0.818
+    anns = [
+        box_annotation(1, [0, 0, 100, 100]),
+        box_annotation(2, [5, 0, 100, 100]),
+        box_annotation(3, [10, 0, 100, 100]),
+    ]
+
+    report = find_overlaps(anns, duplicate_iou=0.85)
+
+    assert [pair["rows"] for pair in report["duplicates"]] == [[0, 1], [1, 2]]
+    assert report["redundant_rows"] == [1]
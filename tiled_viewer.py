@@ -0,0 +1,360 @@
+import hashlib
+import math
+import os
+
+import numpy as np
+from PIL import Image
+
+from boxes import bbox_array
+
+# Edge length of the square pyramid tiles in pixels
+TILE_SIZE = 512
+
+# Directory for the decoded pyramid levels of large images
+PYRAMID_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "coco_dataset_doctor", "pyramids"
+)
+
+# Maximum disk space of the cached pyramid levels
+PYRAMID_CACHE_BYTES = 8 << 30
+
+# Pyramid levels up to this size are kept in memory instead of the disk cache
+IN_MEMORY_LEVEL_BYTES = 64 << 20
+
+# Number of grid cells along the longer image side of the spatial index
+GRID_CELLS = 64
+
+# Factor applied to the zoom per mouse wheel step
+ZOOM_STEP = 1.25
+
+# Maximum zoom in display pixels per image pixel
+MAX_ZOOM = 8.0
+
+# Color of the viewport outside the image
+VIEWPORT_BACKGROUND = (32, 32, 32)
+
+
+def evict_pyramid_cache(cache_dir=PYRAMID_CACHE_DIR, max_bytes=PYRAMID_CACHE_BYTES):
+    """Delete the least recently used level files until the cache fits max_bytes."""
+    try:
+        with os.scandir(cache_dir) as entries:
+            files = [
+                (entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+                for entry in entries
+                if entry.name.endswith(".npy")
+            ]
+    except OSError:
+        return
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+class TilePyramid:
+    """Tile pyramid of one image, decoded lazily level by level.
+
+    Level k holds the image downscaled by 2**k as an array of TILE_SIZE tiles of
+    shape (rows, cols, tile, tile, 3). Image files can not be decoded by region,
+    so a level is decoded once, using the reduced JPEG decoding of draft() where
+    possible. Large levels are written to a memory-mapped file in the pyramid
+    cache, keyed by path, size and modification time, so later views and panning
+    only read the visible tiles from disk.
+    """
+
+    def __init__(self, path, tile_size=TILE_SIZE, cache_dir=PYRAMID_CACHE_DIR):
+        self.path = path
+        self.tile_size = tile_size
+        self.cache_dir = cache_dir
+        self.levels = {}
+        with Image.open(path) as image:
+            self.size = image.size
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{tile_size}"
+        self.cache_key = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        self.num_levels = max(1, math.ceil(math.log2(max(self.size) / tile_size)) + 1)
+
+    def level_size(self, level):
+        """Return the width and height of the image at a level."""
+        scale = 1 << level
+        return -(-self.size[0] // scale), -(-self.size[1] // scale)
+
+    def level_for_zoom(self, zoom):
+        """Return the coarsest level with at least the resolution of the zoom."""
+        if zoom >= 1:
+            return 0
+        return min(self.num_levels - 1, int(math.log2(1 / zoom)))
+
+    def level_file(self, level):
+        """Return the path of the cache file of a level."""
+        return os.path.join(self.cache_dir, f"{self.cache_key}_{level}.npy")
+
+    def load_level(self, level):
+        """Return the tile array of a level, decoding it if it is not cached."""
+        if level in self.levels:
+            return self.levels[level]
+
+        level_file = self.level_file(level)
+        if os.path.exists(level_file):
+            os.utime(level_file)
+            tiles = np.load(level_file, mmap_mode="r")
+        else:
+            tiles = self.decode_level(level)
+        self.levels[level] = tiles
+        return tiles
+
+    def decode_level(self, level):
+        """Decode the image at the resolution of a level and cut it into tiles."""
+        width, height = self.level_size(level)
+        with Image.open(self.path) as image:
+            image.draft("RGB", (width, height))
+            image = image.convert("RGB")
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.BOX)
+
+        size = self.tile_size
+        rows = -(-height // size)
+        cols = -(-width // size)
+        shape = (rows, cols, size, size, 3)
+        if rows * cols * size * size * 3 <= IN_MEMORY_LEVEL_BYTES:
+            tiles = np.empty(shape, dtype=np.uint8)
+            temp_file = None
+        else:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_file = self.level_file(level) + ".tmp"
+            tiles = np.lib.format.open_memmap(
+                temp_file, mode="w+", dtype=np.uint8, shape=shape
+            )
+
+        # Cut one band of tiles at a time, crop() pads the borders with black
+        for row in range(rows):
+            band = np.asarray(
+                image.crop((0, row * size, cols * size, (row + 1) * size))
+            )
+            tiles[row] = band.reshape(size, cols, size, 3).transpose(1, 0, 2, 3)
+
+        if temp_file is None:
+            return tiles
+        tiles.flush()
+        del tiles
+        os.replace(temp_file, self.level_file(level))
+        evict_pyramid_cache(self.cache_dir)
+        return np.load(self.level_file(level), mmap_mode="r")
+
+    def render(self, viewport):
+        """Render the visible region of the viewport from the tiles of one level."""
+        output = Image.new("RGB", viewport.view_size, VIEWPORT_BACKGROUND)
+        level = self.level_for_zoom(viewport.zoom)
+        scale = 1 << level
+        level_width, level_height = self.level_size(level)
+
+        # Visible region in level coordinates, clipped to the image
+        left, top, right, bottom = viewport.region()
+        x0 = max(0.0, left / scale)
+        y0 = max(0.0, top / scale)
+        x1 = min(float(level_width), right / scale)
+        y1 = min(float(level_height), bottom / scale)
+        if x1 <= x0 or y1 <= y0:
+            return output
+
+        # Gather only the visible tiles into one mosaic
+        size = self.tile_size
+        col0, row0 = int(x0 // size), int(y0 // size)
+        col1, row1 = math.ceil(x1 / size), math.ceil(y1 / size)
+        tiles = self.load_level(level)[row0:row1, col0:col1]
+        mosaic = np.ascontiguousarray(tiles.transpose(0, 2, 1, 3, 4)).reshape(
+            (row1 - row0) * size, (col1 - col0) * size, 3
+        )
+
+        # Scale the region to its place in the view
+        dest_x0 = round((x0 * scale - left) * viewport.zoom)
+        dest_y0 = round((y0 * scale - top) * viewport.zoom)
+        dest_x1 = round((x1 * scale - left) * viewport.zoom)
+        dest_y1 = round((y1 * scale - top) * viewport.zoom)
+        region = Image.fromarray(mosaic).resize(
+            (max(1, dest_x1 - dest_x0), max(1, dest_y1 - dest_y0)),
+            Image.BILINEAR,
+            box=(
+                x0 - col0 * size,
+                y0 - row0 * size,
+                x1 - col0 * size,
+                y1 - row0 * size,
+            ),
+        )
+        output.paste(region, (dest_x0, dest_y0))
+        return output
+
+
+class Viewport:
+    """Visible region of an image as zoom and top left corner in image pixels."""
+
+    def __init__(self, image_size, view_size):
+        self.image_size = image_size
+        self.view_size = view_size
+        self.fit_zoom = min(view_size[0] / image_size[0], view_size[1] / image_size[1])
+        self.fit()
+
+    def fit(self):
+        """Show the whole image."""
+        self.zoom = self.fit_zoom
+        self.left = 0.0
+        self.top = 0.0
+        self.clamp()
+
+    def is_fit(self):
+        """Return True if the whole image is visible."""
+        return self.zoom <= self.fit_zoom * (1 + 1e-9)
+
+    def zoom_at(self, factor, x, y):
+        """Zoom by a factor, keeping the image point below view pixel x, y fixed."""
+        image_x = self.left + x / self.zoom
+        image_y = self.top + y / self.zoom
+        self.zoom = min(max(self.zoom * factor, self.fit_zoom), max(MAX_ZOOM, 1.0))
+        self.left = image_x - x / self.zoom
+        self.top = image_y - y / self.zoom
+        self.clamp()
+
+    def pan(self, dx, dy):
+        """Move the image by dx, dy view pixels."""
+        self.left -= dx / self.zoom
+        self.top -= dy / self.zoom
+        self.clamp()
+
+    def clamp(self):
+        """Keep the image in view, centering it along axes where it fits."""
+        corner = []
+        for start, image_length, view_length in zip(
+            (self.left, self.top), self.image_size, self.view_size
+        ):
+            visible = view_length / self.zoom
+            if visible >= image_length:
+                corner.append((image_length - visible) / 2)
+            else:
+                corner.append(min(max(start, 0.0), image_length - visible))
+        self.left, self.top = corner
+
+    def region(self):
+        """Return the visible region as left, top, right, bottom image coordinates."""
+        return (
+            self.left,
+            self.top,
+            self.left + self.view_size[0] / self.zoom,
+            self.top + self.view_size[1] / self.zoom,
+        )
+
+    def to_view(self, boxes):
+        """Convert x, y, w, h image boxes to x0, y0, x1, y1 view coordinates."""
+        view_boxes = np.empty_like(boxes, dtype=np.float64)
+        view_boxes[:, 0] = (boxes[:, 0] - self.left) * self.zoom
+        view_boxes[:, 1] = (boxes[:, 1] - self.top) * self.zoom
+        view_boxes[:, 2] = view_boxes[:, 0] + boxes[:, 2] * self.zoom
+        view_boxes[:, 3] = view_boxes[:, 1] + boxes[:, 3] * self.zoom
+        return view_boxes
+
+
+class GridIndex:
+    """Uniform grid over an image for looking up the boxes in a region.
+
+    Every box is entered into all cells it overlaps. The entries are sorted by
+    cell, row-major, so the cells of one grid row inside a query region form one
+    contiguous slice of the entries.
+    """
+
+    def __init__(self, boxes, image_size, grid_cells=GRID_CELLS):
+        self.boxes = boxes
+        self.cell_size = max(1.0, max(image_size) / grid_cells)
+        self.num_cols = math.ceil(image_size[0] / self.cell_size)
+        self.num_rows = math.ceil(image_size[1] / self.cell_size)
+
+        col0, row0, col1, row1 = self.cell_ranges(
+            boxes[:, 0],
+            boxes[:, 1],
+            boxes[:, 0] + boxes[:, 2],
+            boxes[:, 1] + boxes[:, 3],
+        )
+
+        # Expand every box to one entry per covered cell
+        widths = col1 - col0 + 1
+        counts = widths * (row1 - row0 + 1)
+        box_idx = np.repeat(np.arange(len(boxes)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        rows = row0[box_idx] + offsets // widths[box_idx]
+        cols = col0[box_idx] + offsets % widths[box_idx]
+        cells = rows * self.num_cols + cols
+
+        order = np.argsort(cells, kind="stable")
+        self.entries = box_idx[order]
+        self.cell_starts = np.searchsorted(
+            cells[order], np.arange(self.num_rows * self.num_cols + 1)
+        )
+
+    def cell_ranges(self, x0, y0, x1, y1):
+        """Return the first and last grid column and row covered by each region."""
+
+        def cell(value, num_cells):
+            index = np.floor_divide(value, self.cell_size).astype(np.int64)
+            return np.clip(index, 0, num_cells - 1)
+
+        col0 = cell(x0, self.num_cols)
+        row0 = cell(y0, self.num_rows)
+        return (
+            col0,
+            row0,
+            np.maximum(cell(x1, self.num_cols), col0),
+            np.maximum(cell(y1, self.num_rows), row0),
+        )
+
+    def query(self, left, top, right, bottom):
+        """Return the sorted indices of the boxes intersecting a region."""
+        if not len(self.boxes):
+            return np.zeros(0, dtype=np.int64)
+        col0, row0, col1, row1 = (
+            int(value) for value in self.cell_ranges(left, top, right, bottom)
+        )
+        candidates = [
+            self.entries[
+                self.cell_starts[row * self.num_cols + col0] : self.cell_starts[
+                    row * self.num_cols + col1 + 1
+                ]
+            ]
+            for row in range(row0, row1 + 1)
+        ]
+        candidates = np.unique(np.concatenate(candidates))
+
+        # Drop candidates that only share a cell with the region
+        boxes = self.boxes[candidates]
+        inside = (
+            (boxes[:, 0] <= right)
+            & (boxes[:, 0] + boxes[:, 2] >= left)
+            & (boxes[:, 1] <= bottom)
+            & (boxes[:, 1] + boxes[:, 3] >= top)
+        )
+        return candidates[inside]
+
+
+class ZoomView:
+    """Zoomable view of one image with its tile pyramid and annotation index."""
+
+    def __init__(self, image_id, image_path, anns, view_size):
+        self.image_id = image_id
+        self.pyramid = TilePyramid(image_path)
+        self.viewport = Viewport(self.pyramid.size, view_size)
+        self.anns = anns
+        self.grid_index = GridIndex(bbox_array(anns), self.pyramid.size)
+
+    def render(self):
+        """Render the visible part of the image."""
+        return self.pyramid.render(self.viewport)
+
+    def visible_annotations(self):
+        """Return the annotations intersecting the viewport and their view boxes."""
+        rows = self.grid_index.query(*self.viewport.region())
+        view_boxes = self.viewport.to_view(self.grid_index.boxes[rows])
+        return [self.anns[row] for row in rows.tolist()], view_boxes